@@ -1,12 +1,162 @@
-import json
 import asyncio
+import math
+from urllib.parse import parse_qs
+from functools import wraps
+import numpy as np
+import orjson
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.db import connection
-from .movement_utils import calculate_distance
+from django.db import close_old_connections, reset_queries
+from .movement_utils import haversine_distances, equirectangular_mask
+from .notifications import capture_event_loop
 
 
-class PlanePositionsConsumer(AsyncWebsocketConsumer):
+def db_safe(fn):
+    """
+    database_sync_to_async with connection hygiene
+    Closes stale connections around each call and drops the query log, so
+    thread-pool workers don't leak connections/memory under Daphne and
+    CONN_MAX_AGE reuse keeps working
+    """
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        close_old_connections()
+        reset_queries()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return database_sync_to_async(wrapper)
+
+
+# every position-watching socket registers itself here
+_connected_consumers = set()
+
+# single shared broadcast task + the snapshot it computed for the current tick
+_broadcast_task = None
+_latest_positions = None
+
+# how many sockets get their payload before yielding back to the event loop
+BROADCAST_BATCH_SIZE = 50
+
+
+async def _broadcast_positions_loop():
+    """
+    Compute plane positions ONCE per tick and fan out to all sockets.
+    Sends happen in batches of BROADCAST_BATCH_SIZE with an event-loop
+    yield in between, so hundreds of clients don't starve accept()/receive().
+    """
+    global _latest_positions
+    from .movement_manager import movement_manager
+
+    TARGET_INTERVAL = 2.0  # seconds
+    TOLERANCE = 0.5  # seconds
+
+    # cache the loop once - no per-tick event-loop API lookups
+    loop = asyncio.get_running_loop()
+
+    # schedule against an absolute deadline so ticks don't drift under load
+    deadline = loop.time()
+
+    while True:
+        try:
+            deadline += TARGET_INTERVAL
+            timestamp = int(loop.time())
+
+            # one snapshot for all clients this tick
+            _latest_positions = movement_manager.get_positions_with_heading()
+
+            clients = list(_connected_consumers)
+
+            for i in range(0, len(clients), BROADCAST_BATCH_SIZE):
+                batch = clients[i:i + BROADCAST_BATCH_SIZE]
+                await asyncio.gather(
+                    *(client.deliver_positions(timestamp) for client in batch),
+                    return_exceptions=True
+                )
+                # let other coroutines make progress between batches
+                await asyncio.sleep(0)
+
+            now = loop.time()
+            if now - deadline > TOLERANCE:
+                print(f"Broadcasting plane positions is slow: {now - deadline:.3f}s behind schedule (target: {TARGET_INTERVAL}s)")
+
+            await asyncio.sleep(max(0.0, deadline - now))
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Position broadcast error: {e}")
+            await asyncio.sleep(1)
+            deadline = loop.time()  # re-sync the schedule after an error
+
+
+def _ensure_broadcast_task():
+    """Start the shared broadcast task on first use (needs a running loop)"""
+    from .movement_manager import movement_manager
+
+    # first spot with a running loop: move the movement/save workers from
+    # their startup threads onto it and point the HTTP-side notification
+    # helpers at it
+    movement_manager.attach_to_loop()
+    capture_event_loop()
+
+    global _broadcast_task
+    if _broadcast_task is None or _broadcast_task.done():
+        _broadcast_task = asyncio.create_task(_broadcast_positions_loop())
+
+
+# static control-plane payloads, encoded once at import time
+_MSG_RATE_LIMITED = orjson.dumps({'type': 'error', 'message': 'rate_limited'})
+_MSG_INVALID_JSON = orjson.dumps({'type': 'error', 'message': 'Invalid JSON format'})
+_MSG_INVALID_RADIUS = orjson.dumps({'type': 'error', 'message': 'Invalid radius filter parameters'})
+_MSG_INVALID_BBOX = orjson.dumps({'type': 'error', 'message': 'Invalid bounding box filter parameters'})
+_MSG_INVALID_FILTER = orjson.dumps({'type': 'error', 'message': 'Invalid filter format'})
+_MSG_FILTERS_CLEARED = orjson.dumps({'type': 'filters_cleared', 'message': 'Filters cleared'})
+_MSG_PILOT_CONNECTED = orjson.dumps({
+    'type': 'connection_established',
+    'message': 'Connection established. Please authenticate yourself with your pilot name.'
+})
+_MSG_STATUS_CONNECTED = orjson.dumps({
+    'type': 'connection_established',
+    'message': 'Successfully connected to the command status channel.'
+})
+
+
+class TokenBucketMixin:
+    """
+    Per-socket token bucket rate limit for receive()
+    O(1) wall-time check, no external store - stops a buggy client from
+    spamming messages that fan out into DB work
+    """
+    RATE_LIMIT_BURST = 20.0  # max tokens (burst)
+    RATE_LIMIT_RATE = 5.0    # tokens per second (sustained)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._tokens = self.RATE_LIMIT_BURST
+        self._last_refill = None
+
+    def consume_token(self):
+        """Take one token, returns False when the bucket is empty"""
+        now = asyncio.get_event_loop().time()
+
+        if self._last_refill is not None:
+            self._tokens = min(
+                self.RATE_LIMIT_BURST,
+                self._tokens + (now - self._last_refill) * self.RATE_LIMIT_RATE
+            )
+        self._last_refill = now
+
+        if self._tokens < 1.0:
+            return False
+
+        self._tokens -= 1.0
+        return True
+
+
+class PlanePositionsConsumer(TokenBucketMixin, AsyncWebsocketConsumer):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         # Radius filtering
@@ -18,14 +168,13 @@ class PlanePositionsConsumer(AsyncWebsocketConsumer):
         self.max_lat = None
         self.min_lng = None
         self.max_lng = None
-        self.is_sending = False
-        self.send_task = None
 
     async def connect(self):
         await self.accept()
         
-        query_string = self.scope.get('query_string', b'').decode()
-        params = dict(param.split('=') for param in query_string.split('&') if '=' in param)
+        # parse_qs is C-accelerated and handles '=' inside values correctly
+        query_string = self.scope.get('query_string', b'').decode('ascii', 'ignore')
+        params = {key: values[0] for key, values in parse_qs(query_string).items()}
         
         # radius filter parameters
         try:
@@ -74,26 +223,36 @@ class PlanePositionsConsumer(AsyncWebsocketConsumer):
             }
         
         # send connection established message
-        await self.send(text_data=json.dumps({
+        await self.send(bytes_data=orjson.dumps({
             'type': 'connection_established',
             'message': 'WebSocket connection established',
             'filters': filter_info
         }))
         
-        # start periodic data sending
-        self.is_sending = True
-        self.send_task = asyncio.create_task(self.send_positions_periodically())
-    
+        # one-time plane directory: id -> [name, pilot] - position frames
+        # afterwards carry only the numeric columns
+        from .movement_manager import movement_manager
+        await self.send(bytes_data=orjson.dumps({
+            'type': 'plane_directory',
+            'planes': movement_manager.get_plane_meta()
+        }, option=orjson.OPT_NON_STR_KEYS))
+
+        # register for the shared broadcast and make sure the broadcaster runs
+        _connected_consumers.add(self)
+        _ensure_broadcast_task()
+
     async def disconnect(self, close_code):
-        self.is_sending = False
-        if self.send_task:
-            self.send_task.cancel()
+        _connected_consumers.discard(self)
 
     async def receive(self, text_data):
+        if not self.consume_token():
+            await self.send(bytes_data=_MSG_RATE_LIMITED)
+            return
+
         try:
-            data = json.loads(text_data)
+            data = orjson.loads(text_data)
             message_type = data.get('type')
-            
+
             if message_type == 'update_filters':
                 # update filters
                 # radius filter check
@@ -105,7 +264,7 @@ class PlanePositionsConsumer(AsyncWebsocketConsumer):
                         # clear bounding box
                         self.min_lat = self.max_lat = self.min_lng = self.max_lng = None
                         
-                        await self.send(text_data=json.dumps({
+                        await self.send(bytes_data=orjson.dumps({
                             'type': 'filters_updated',
                             'message': 'Radius filter updated',
                             'filters': {
@@ -116,10 +275,7 @@ class PlanePositionsConsumer(AsyncWebsocketConsumer):
                             }
                         }))
                     except (ValueError, TypeError):
-                        await self.send(text_data=json.dumps({
-                            'type': 'error',
-                            'message': 'Invalid radius filter parameters'
-                        }))
+                        await self.send(bytes_data=_MSG_INVALID_RADIUS)
                 
                 # bounding box filter check
                 elif all(p in data for p in ['min_lat', 'max_lat', 'min_lng', 'max_lng']):
@@ -131,7 +287,7 @@ class PlanePositionsConsumer(AsyncWebsocketConsumer):
                         # clear radius
                         self.lat = self.lng = self.radius = None
                         
-                        await self.send(text_data=json.dumps({
+                        await self.send(bytes_data=orjson.dumps({
                             'type': 'filters_updated',
                             'message': 'Bounding box filter updated',
                             'filters': {
@@ -143,149 +299,205 @@ class PlanePositionsConsumer(AsyncWebsocketConsumer):
                             }
                         }))
                     except (ValueError, TypeError):
-                        await self.send(text_data=json.dumps({
-                            'type': 'error',
-                            'message': 'Invalid bounding box filter parameters'
-                        }))
+                        await self.send(bytes_data=_MSG_INVALID_BBOX)
                 
                 else:
-                    await self.send(text_data=json.dumps({
-                        'type': 'error',
-                        'message': 'Invalid filter format'
-                    }))
+                    await self.send(bytes_data=_MSG_INVALID_FILTER)
             
             elif message_type == 'clear_filters':
                 # clear filters
                 self.lat = self.lng = self.radius = None
                 self.min_lat = self.max_lat = self.min_lng = self.max_lng = None
                 
-                await self.send(text_data=json.dumps({
-                    'type': 'filters_cleared',
-                    'message': 'Filters cleared'
-                }))
+                await self.send(bytes_data=_MSG_FILTERS_CLEARED)
                 
-        except json.JSONDecodeError:
-            await self.send(text_data=json.dumps({
-                'type': 'error',
-                'message': 'Invalid JSON format'
-            }))
+        except orjson.JSONDecodeError:
+            await self.send(bytes_data=_MSG_INVALID_JSON)
 
-    async def send_positions_periodically(self):
-        """Send plane positions every 2 seconds - Dynamic Sleep"""
-        TARGET_INTERVAL = 2.0  # seconds
-        
-        while self.is_sending:
+    def has_filter(self):
+        return bool((self.lat and self.lng and self.radius) or
+                    (self.min_lat and self.max_lat and self.min_lng and self.max_lng))
+
+    async def deliver_positions(self, timestamp):
+        """Broadcast tick: filter the shared snapshot for this client and send"""
+        from .movement_manager import movement_manager
+
+        positions_with_heading = _latest_positions
+        if positions_with_heading is None:
+            return
+
+        try:
+            # filterless clients share the whole-fleet frame the manager
+            # packs straight from its snapshot (cached per tick)
+            if not self.has_filter():
+                await self.send(bytes_data=movement_manager.get_positions_packed(timestamp))
+                return
+
+            ids, lngs, lats, headings, going, filter_info = self.get_filtered_arrays(positions_with_heading)
+
+            await self.send(bytes_data=movement_manager.pack_positions_frame(
+                ids, lngs, lats, headings, going, filter_info, timestamp
+            ))
+        except Exception as e:
+            # socket may already be closing, error report is best effort
             try:
-                start_time = asyncio.get_event_loop().time()
-                
-                # get plane positions
-                positions_data = await self.get_filtered_positions()
-                
-                # send to frontend
-                await self.send(text_data=json.dumps({
-                    'type': 'positions_update',
-                    'data': positions_data,
-                    'timestamp': int(start_time)
-                }))
-                
-                # calculate elapsed time
-                elapsed_time = asyncio.get_event_loop().time() - start_time
-                sleep_time = TARGET_INTERVAL - elapsed_time
-                
-                # if process takes more than 2 seconds, sleep
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-                # if process takes too long, warn
-                elif elapsed_time > TARGET_INTERVAL + 0.5:  #0.5s tolerance
-                    print(f"Sending plane positions to frontend is slow: {elapsed_time:.3f}s (target: {TARGET_INTERVAL}s)")
-                
-            except Exception as e:
-                await self.send(text_data=json.dumps({
+                await self.send(bytes_data=orjson.dumps({
                     'type': 'error',
                     'message': f'Data sending error: {str(e)}'
                 }))
-                break
+            except Exception:
+                pass
 
-    @database_sync_to_async
-    def get_filtered_positions(self):
-        """Get filtered plane positions - read from memory"""
+    def get_filtered_arrays(self, positions_with_heading):
+        """
+        Filter the shared positions snapshot - pure in-memory, no DB access
+        Returns (ids, lngs, lats, headings, going, filter_info) NumPy columns
+        ready to be packed into a binary frame
+        """
         from .movement_manager import movement_manager
-        from .models import Plane
-        
-        # get positions from MovementManager
-        positions_with_heading = movement_manager.get_positions_with_heading()
-        
-        # get plane information from database
-        plane_info = {}
-        planes_in_db = Plane.objects.select_related('pilot').all()
-        for plane in planes_in_db:
-            plane_info[plane.id] = {
-                'name': plane.name,
-                'pilot_name': plane.pilot.name if plane.pilot else 'Pilot Yok'
+
+        # describe the active filter up front, so even a tick with zero
+        # candidates reports the right filters in the frame header
+        if self.lat and self.lng and self.radius:
+            filter_info = {
+                'type': 'radius',
+                'lat': self.lat,
+                'lng': self.lng,
+                'radius': self.radius
             }
-        
-        filter_info = None
-        planes = []
-        
-        # process positions in memory
-        for plane_id, pos in positions_with_heading.items():
-            lat = pos['current_lat']
-            lng = pos['current_lng']
-            heading = pos['heading']
-            is_going_to_end = pos['is_going_to_end']
-            
-            # apply filter
-            skip_plane = False
-            
-            # radius filter
+        elif self.min_lat and self.max_lat and self.min_lng and self.max_lng:
+            filter_info = {
+                'type': 'bounding_box',
+                'min_lat': self.min_lat,
+                'max_lat': self.max_lat,
+                'min_lng': self.min_lng,
+                'max_lng': self.max_lng
+            }
+        else:
+            filter_info = None
+
+        # broad-phase pruning with the R-tree before any exact math
+        if len(positions_with_heading) > 0:
+            candidate_ids = None
+
             if self.lat and self.lng and self.radius:
-                distance = calculate_distance(lat, lng, self.lat, self.lng)
-                if distance > self.radius * 1000:  # in meters
-                    skip_plane = True
-                
-                if not filter_info:
-                    filter_info = {
-                        'type': 'radius',
-                        'lat': self.lat,
-                        'lng': self.lng,
-                        'radius': self.radius
-                    }
-            
-            # bounding box filter
+                # padded bbox query (km -> degrees), exact Haversine
+                # refinement below - the longitude pad widens by cos(lat)
+                # so the box never undershoots the radius away from the
+                # equator (same conservative formula the refine step uses)
+                lat_pad = self.radius / 111.0
+                lng_pad = self.radius / (111.0 * max(math.cos(math.radians(self.lat)), 0.01))
+                lat_min = self.lat - lat_pad
+                lat_max = self.lat + lat_pad
+                west = self.lng - lng_pad
+                east = self.lng + lng_pad
+
+                # the index stores longitudes in [-180, 180], so a box
+                # spilling over the antimeridian has to be queried as the
+                # two wrapped halves - the Haversine refinement below is
+                # already seam-safe
+                if lng_pad >= 180.0:
+                    halves = None  # box circles the globe, nothing to prune
+                elif east > 180.0:
+                    halves = ((west, 180.0), (-180.0, east - 360.0))
+                elif west < -180.0:
+                    halves = ((west + 360.0, 180.0), (-180.0, east))
+                else:
+                    halves = ((west, east),)
+
+                if halves is not None:
+                    for half_west, half_east in halves:
+                        part = movement_manager.query_bbox(
+                            half_west, lat_min, half_east, lat_max
+                        )
+                        if part is None:  # no index built yet
+                            candidate_ids = None
+                            break
+                        candidate_ids = (
+                            part if candidate_ids is None
+                            else candidate_ids + part
+                        )
             elif self.min_lat and self.max_lat and self.min_lng and self.max_lng:
-                if not (self.min_lat <= lat <= self.max_lat and self.min_lng <= lng <= self.max_lng):
-                    skip_plane = True
-                
-                if not filter_info:
-                    filter_info = {
-                        'type': 'bounding_box',
-                        'min_lat': self.min_lat,
-                        'max_lat': self.max_lat,
-                        'min_lng': self.min_lng,
-                        'max_lng': self.max_lng
-                    }
-            
-            # skip plane
-            if skip_plane:
-                continue
-            
-            # get plane information
-            info = plane_info.get(plane_id, {'name': f'Plane {plane_id}', 'pilot_name': 'Pilot Yok'})
-            
-            # Format: [id, name, pilot, lng, lat, heading]
-            planes.append([plane_id, info['name'], info['pilot_name'], lng, lat, heading])
-        
-        # sort by id
-        planes.sort(key=lambda x: x[0])
-        
-        return {
-            'planes': planes,
-            'count': len(planes),
-            'filters': filter_info
-        }
+                candidate_ids = movement_manager.query_bbox(
+                    self.min_lng, self.min_lat, self.max_lng, self.max_lat
+                )
+
+            if candidate_ids is not None:
+                # the index returns candidates in tree order - restore id order
+                # here so the snapshot's sorted invariant is preserved
+                candidate_ids.sort()
+                positions_with_heading = {
+                    plane_id: positions_with_heading[plane_id]
+                    for plane_id in candidate_ids
+                    if plane_id in positions_with_heading
+                }
+
+        # process the candidates in memory - vectorized with NumPy
+        count = len(positions_with_heading)
+        if count == 0:
+            empty = np.empty(0, dtype=np.float64)
+            return (np.empty(0, dtype=np.int64), empty, empty, empty,
+                    np.empty(0, dtype=np.uint8), filter_info)
+
+        # build arrays once per tick, filter at C level instead of per-plane Python trig
+        ids = np.fromiter(positions_with_heading.keys(), dtype=np.int64, count=count)
+        lats = np.fromiter((pos['current_lat'] for pos in positions_with_heading.values()), dtype=np.float64, count=count)
+        lngs = np.fromiter((pos['current_lng'] for pos in positions_with_heading.values()), dtype=np.float64, count=count)
+        headings = np.fromiter((pos['heading'] for pos in positions_with_heading.values()), dtype=np.float64, count=count)
+        going = np.fromiter((pos['is_going_to_end'] for pos in positions_with_heading.values()), dtype=np.uint8, count=count)
+
+        mask = None
+
+        # radius filter
+        if self.lat and self.lng and self.radius:
+            radius_m = self.radius * 1000  # km -> meters
+
+            # cheap degree-box prune before any trig (filter-then-refine);
+            # 4 comparisons reject the far-away majority, refinement below
+            # only touches the planes inside the box
+            lat_tol = self.radius / 111.0  # km -> degrees
+            lng_tol = self.radius / (111.0 * max(math.cos(math.radians(self.lat)), 0.01))
+            # wrapped longitude delta - centers near +-180 keep planes
+            # just across the seam
+            dlng = np.remainder(lngs - self.lng + 180.0, 360.0) - 180.0
+            near = ((np.abs(lats - self.lat) <= lat_tol) &
+                    (np.abs(dlng) <= lng_tol))
+
+            mask = np.zeros(count, dtype=bool)
+            near_idx = np.flatnonzero(near)
+
+            if near_idx.size > 0:
+                # equirectangular fast path for the common small-radius case,
+                # full Haversine only for huge radii or near the poles where
+                # the projection distorts
+                if self.radius <= 500 and abs(self.lat) <= 70:
+                    refined = equirectangular_mask(
+                        lats[near_idx], lngs[near_idx], self.lat, self.lng, radius_m
+                    )
+                else:
+                    distances = haversine_distances(lats[near_idx], lngs[near_idx], self.lat, self.lng)
+                    refined = distances <= radius_m
+
+                mask[near_idx[refined]] = True
 
+        # bounding box filter - no trig needed at all
+        elif self.min_lat and self.max_lat and self.min_lng and self.max_lng:
+            mask = ((lats >= self.min_lat) & (lats <= self.max_lat) &
+                    (lngs >= self.min_lng) & (lngs <= self.max_lng))
+
+        # keep only the survivors
+        if mask is not None:
+            ids = ids[mask]
+            lats = lats[mask]
+            lngs = lngs[mask]
+            headings = headings[mask]
+            going = going[mask]
+
+        # already in id order - MovementManager keeps positions sorted
+        return ids, lngs, lats, headings, going, filter_info
 
-class PilotCommandConsumer(AsyncWebsocketConsumer):
+
+class PilotCommandConsumer(TokenBucketMixin, AsyncWebsocketConsumer):
     """
     WebSocket consumer for pilot command notifications.
     - Each pilot connects and authenticates itself.
@@ -298,11 +510,9 @@ class PilotCommandConsumer(AsyncWebsocketConsumer):
         self.pilot_group_name = None
 
     async def connect(self):
+        capture_event_loop()
         await self.accept()
-        await self.send(text_data=json.dumps({
-            'type': 'connection_established',
-            'message': 'Connection established. Please authenticate yourself with your pilot name.'
-        }))
+        await self.send(bytes_data=_MSG_PILOT_CONNECTED)
 
     async def disconnect(self, close_code):
         if self.pilot_group_name:
@@ -312,8 +522,12 @@ class PilotCommandConsumer(AsyncWebsocketConsumer):
             )
 
     async def receive(self, text_data):
+        if not self.consume_token():
+            await self.send_error("rate_limited")
+            return
+
         try:
-            data = json.loads(text_data)
+            data = orjson.loads(text_data)
             message_type = data.get('type')
 
             if message_type == 'authenticate':
@@ -327,7 +541,7 @@ class PilotCommandConsumer(AsyncWebsocketConsumer):
             else:
                 await self.send_error("Please authenticate yourself first.")
         
-        except json.JSONDecodeError:
+        except orjson.JSONDecodeError:
             await self.send_error("Invalid JSON format.")
         except Exception as e:
             await self.send_error(f"An error occurred: {str(e)}")
@@ -350,7 +564,7 @@ class PilotCommandConsumer(AsyncWebsocketConsumer):
                 self.channel_name
             )
             
-            await self.send(text_data=json.dumps({
+            await self.send(bytes_data=orjson.dumps({
                 'type': 'authenticated',
                 'message': f"Pilot {self.pilot_name} authenticated successfully.",
                 'pilot': self.pilot_name,
@@ -365,44 +579,47 @@ class PilotCommandConsumer(AsyncWebsocketConsumer):
 
     async def send_pending_commands(self):
         pending_commands = await self.get_pending_commands_for_pilot()
-        await self.send(text_data=json.dumps({
+        await self.send(bytes_data=orjson.dumps({
             'type': 'pending_commands',
             'commands': pending_commands
         }))
 
     # Handler for group messages (from backend)
     async def command_new(self, event):
-        await self.send(text_data=json.dumps({
+        await self.send(bytes_data=orjson.dumps({
             'type': 'new_command',
             'command': event['command']
         }))
 
     async def command_update(self, event):
         """Triggered when command status is updated"""
-        await self.send(text_data=json.dumps({
+        await self.send(bytes_data=orjson.dumps({
             'type': 'command_status_update',
             'command': event['command']
         }))
 
     # Utility methods
     async def send_error(self, message):
-        await self.send(text_data=json.dumps({
+        await self.send(bytes_data=orjson.dumps({
             'type': 'error',
             'message': message
         }))
 
-    @database_sync_to_async
+    @db_safe
     def get_pilot_and_plane(self, pilot_name):
-        """Get pilot and plane from database"""
+        """Get pilot and plane from database - one query in the common case"""
         from .models import Pilot, Plane
-        try:
-            pilot = Pilot.objects.get(name=pilot_name)
-            plane = Plane.objects.filter(pilot=pilot).first()
-            return pilot, plane
-        except Pilot.DoesNotExist:
-            return None, None
 
-    @database_sync_to_async
+        # pilot + plane in a single JOIN roundtrip
+        plane = Plane.objects.select_related('pilot').filter(pilot__name=pilot_name).first()
+        if plane:
+            return plane.pilot, plane
+
+        # pilot without a plane (or unknown pilot)
+        pilot = Pilot.objects.filter(name=pilot_name).first()
+        return pilot, None
+
+    @db_safe
     def get_pending_commands_for_pilot(self):
         """Get pending commands for the pilot"""
         from .models import Command
@@ -424,16 +641,14 @@ class CommandStatusConsumer(AsyncWebsocketConsumer):
     COMMAND_STATUS_GROUP = "command_status_updates"
 
     async def connect(self):
+        capture_event_loop()
         # accept the incoming connection and add to the group
         await self.channel_layer.group_add(
             self.COMMAND_STATUS_GROUP,
             self.channel_name
         )
         await self.accept()
-        await self.send(text_data=json.dumps({
-            'type': 'connection_established',
-            'message': 'Successfully connected to the command status channel.'
-        }))
+        await self.send(bytes_data=_MSG_STATUS_CONNECTED)
 
     async def disconnect(self, close_code):
         # remove from the group when the connection is closed
@@ -448,7 +663,17 @@ class CommandStatusConsumer(AsyncWebsocketConsumer):
         command status update (from views.py)
         sends to the connected client.
         """
-        await self.send(text_data=json.dumps({
+        await self.send(bytes_data=orjson.dumps({
             'type': 'command_status_update',
             'command': event['command']
-        })) 
\ No newline at end of file
+        }))
+
+    async def command_update_batch(self, event):
+        """
+        Batched command status updates - the backend coalesces bursts of
+        accepts/rejects into a single group message
+        """
+        await self.send(bytes_data=orjson.dumps({
+            'type': 'command_status_update_batch',
+            'commands': event['commands']
+        }))
\ No newline at end of file
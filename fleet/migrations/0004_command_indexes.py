@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-08-29 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fleet', '0003_add_direction_field'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='command',
+            index=models.Index(fields=['plane', '-created_at'], name='fleet_cmd_plane_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='command',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['status'], name='fleet_cmd_pending_idx'),
+        ),
+    ]
@@ -49,3 +49,10 @@ class Command(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # the commands action lists one plane's commands newest-first
+            models.Index(fields=['plane', '-created_at'], name='fleet_cmd_plane_created_idx'),
+            # pending lists/consumers only ever touch rows still waiting
+            models.Index(fields=['status'], condition=models.Q(status='pending'),
+                         name='fleet_cmd_pending_idx'),
+        ]
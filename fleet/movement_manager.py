@@ -3,186 +3,636 @@ Movement Manager
 Uçak hareket yönetimi ana sistemi
 """
 
+import asyncio
+import math
 import threading
 import time
 import logging
 from typing import Dict, Tuple, Optional
+
+import numpy as np
+import orjson
+
+from channels.db import database_sync_to_async
+from django.contrib.gis.geos import Point
 from django.db import transaction
-from django.core.exceptions import ObjectDoesNotExist
-from .models import Plane
-from .movement_utils import calculate_bearing, move_towards_target
+from django.db.models import FloatField, Func
+from django.db.models.signals import post_save, post_delete
+from .models import Plane, Pilot
+from .movement_utils import calculate_bearings_vec, move_towards_target_vec, hilbert_key
+
+try:
+    from rtree import index as rtree_index
+except ImportError:
+    rtree_index = None
 
 
 logger = logging.getLogger(__name__)
 
 
+# binary positions frame layout: one 17-byte record per plane
+# (ids and direction as integers, coordinates/heading as float32 - half the
+# bandwidth of float64 and far less than a JSON row per plane)
+POSITION_RECORD = np.dtype([
+    ('id', '<i4'), ('lng', '<f4'), ('lat', '<f4'),
+    ('heading', '<f4'), ('going', '<u1')
+])
+
+
 class MovementManager:
     """
     Aircraft movement management system
     - Keeps current positions in memory
     - Updates positions every 2 seconds
-    - Saves to database every 2 minutes
+    - Saves dirty planes to database when enough changed or every 2 minutes
     """
     
     def __init__(self):
         self.running = False
         self.movement_thread = None
         self.db_save_thread = None
+
+        # set on stop() - thread loops sleep on wait(), so shutdown wakes
+        # them immediately instead of waiting out the poll interval
+        self._stop_event = threading.Event()
+
+        # asyncio workers (preferred when an event loop is already running,
+        # e.g. under the ASGI server) - the thread workers are the fallback
+        self._movement_task = None
+        self._db_save_task = None
         
-        # current positions in memory
-        # {plane_id: {'current_lat': float, 'current_lng': float, 'target_lat': float, 'target_lng': float, 'is_going_to_end': bool}}
-        self.plane_positions: Dict[int, Dict] = {}
-        
-        # thread safety lock
-        self.positions_lock = threading.Lock()
+        # current positions as an immutable published snapshot (RCU pattern):
+        # (ids, lat, lng, tlat, tlng, going, last_updated) - parallel NumPy
+        # arrays sorted by plane id. Readers load the attribute (atomic in
+        # CPython) and work on the tuple without any lock; the writer builds
+        # fresh arrays off-line and publishes a new tuple, never mutating a
+        # published one
+        self._snapshot: tuple = (
+            np.empty(0, dtype=np.int64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=np.float64),
+            np.empty(0, dtype=bool),
+            0.0
+        )
+
+        # route endpoints cached at load time - they never change in flight,
+        # so direction flips swap targets from memory instead of hitting the DB
+        # (writer-side state, only touched under _writer_lock)
+        self.start_lat = np.empty(0, dtype=np.float64)
+        self.start_lng = np.empty(0, dtype=np.float64)
+        self.end_lat = np.empty(0, dtype=np.float64)
+        self.end_lng = np.empty(0, dtype=np.float64)
+
+        # dirty mask (writer-side, parallel to the snapshot arrays) - marks
+        # planes whose persisted state changed since the last DB flush, so
+        # the flush skips rows the database already has
+        self._dirty = np.empty(0, dtype=bool)
+
+        # precomputed target-side trig, kept in sync with the snapshot's
+        # target arrays (writer-side state) - targets change rarely, so
+        # radians/sin/cos of the target is paid per change, not per tick
+        self._tlat_rad = np.empty(0, dtype=np.float64)
+        self._tlng_rad = np.empty(0, dtype=np.float64)
+        self._sin_tlat = np.empty(0, dtype=np.float64)
+        self._cos_tlat = np.empty(0, dtype=np.float64)
+
+        # excludes concurrent writers only (movement tick, target updates,
+        # removals) - readers never take it
+        self._writer_lock = threading.Lock()
+
+        # R-tree spatial index over current positions (broad-phase pruning)
+        # rebuilt on every movement tick, swapped in atomically
+        self.spatial_index = None
+
+        # plane metadata cache {plane_id: (name, pilot_name)} - nearly static,
+        # refreshed from the movement thread when the stale flag is set
+        self._plane_meta: Dict[int, Tuple[str, str]] = {}
+        self._plane_meta_stale = True
+
+        # whole-fleet binary frame cached per broadcast tick - every
+        # filterless websocket client shares the same bytes
+        self._packed_frame: Optional[Tuple[int, bytes]] = None
+
+        # headings computed at most once per published snapshot, keyed by
+        # snapshot identity - shared by every snapshot() caller
+        self._heading_cache: Optional[Tuple[tuple, np.ndarray]] = None
         
         # movement parameters
         self.MOVEMENT_DISTANCE = 600  # meters
         self.MOVEMENT_INTERVAL = 2  # seconds
-        self.DB_SAVE_INTERVAL = 120  # seconds (2 minutes)
+
+        # the step size never changes while the process runs, so the step
+        # angle (distance / earth radius) and its sin/cos are folded once
+        # here instead of once per movement tick
+        self._step_ang = self.MOVEMENT_DISTANCE / 6371000.0
+        self._sin_step = math.sin(self._step_ang)
+        self._cos_step = math.cos(self._step_ang)
+
+        # flush scheduling: the save loop wakes every DB_SAVE_POLL seconds
+        # and flushes when enough rows are dirty OR the last flush is older
+        # than DB_SAVE_INTERVAL - each flush writes at most
+        # DB_SAVE_BATCH_THRESHOLD rows, rotating through the fleet, so the
+        # write load stays smooth even when every plane is moving
+        self.DB_SAVE_INTERVAL = 120  # seconds (max flush age, 2 minutes)
+        self.DB_SAVE_POLL = 5  # seconds
+        self.DB_SAVE_BATCH_THRESHOLD = 500  # dirty rows (trigger and per-flush cap)
+        self._last_flush = time.time()
+        self._flush_cursor = 0  # rotation point for capped flushes
         
         logger.info("MovementManager initialized")
     
     def load_planes_from_db(self):
         """Load planes from database"""
         try:
-            planes = Plane.objects.all()
-            with self.positions_lock:
-                self.plane_positions.clear()
-                
-                for plane in planes:
-                    self.plane_positions[plane.id] = {
-                        'current_lat': float(plane.current_position.y),  # PointField.y = latitude
-                        'current_lng': float(plane.current_position.x),  # PointField.x = longitude
-                        'target_lat': float(plane.end_point.y) if plane.is_going_to_end else float(plane.start_point.y),
-                        'target_lng': float(plane.end_point.x) if plane.is_going_to_end else float(plane.start_point.x),
-                        'is_going_to_end': plane.is_going_to_end,
-                        'last_updated': time.time()
-                    }
-            
-            logger.info(f"{len(self.plane_positions)} planes loaded to memory")
-            
+            # extract coordinates with ST_X/ST_Y in the database and stream
+            # plain float tuples - no Plane instantiation, no GEOSGeometry
+            # WKB parsing per row. Loaded in id order so the arrays stay
+            # pre-sorted and readers never need to re-sort
+            rows = Plane.objects.annotate(
+                cx=Func('current_position', function='ST_X', output_field=FloatField()),
+                cy=Func('current_position', function='ST_Y', output_field=FloatField()),
+                sx=Func('start_point', function='ST_X', output_field=FloatField()),
+                sy=Func('start_point', function='ST_Y', output_field=FloatField()),
+                ex=Func('end_point', function='ST_X', output_field=FloatField()),
+                ey=Func('end_point', function='ST_Y', output_field=FloatField()),
+            ).values_list(
+                'id', 'cx', 'cy', 'sx', 'sy', 'ex', 'ey', 'is_going_to_end'
+            ).order_by('id')
+
+            ids, lats, lngs, going = [], [], [], []
+            slats, slngs, elats, elngs = [], [], [], []
+            for plane_id, cx, cy, sx, sy, ex, ey, is_going in rows.iterator(chunk_size=1000):
+                ids.append(plane_id)
+                lats.append(cy)  # ST_Y = latitude
+                lngs.append(cx)  # ST_X = longitude
+                going.append(is_going)
+                slats.append(sy)
+                slngs.append(sx)
+                elats.append(ey)
+                elngs.append(ex)
+
+            with self._writer_lock:
+                ids_arr = np.array(ids, dtype=np.int64)
+                lat_arr = np.array(lats, dtype=np.float64)
+                lng_arr = np.array(lngs, dtype=np.float64)
+                going_arr = np.array(going, dtype=bool)
+                self.start_lat = np.array(slats, dtype=np.float64)
+                self.start_lng = np.array(slngs, dtype=np.float64)
+                self.end_lat = np.array(elats, dtype=np.float64)
+                self.end_lng = np.array(elngs, dtype=np.float64)
+
+                # current target follows the travel direction
+                tlat_arr = np.where(going_arr, self.end_lat, self.start_lat)
+                tlng_arr = np.where(going_arr, self.end_lng, self.start_lng)
+                self._refresh_target_trig(tlat_arr, tlng_arr)
+
+                # memory matches the DB right after loading
+                self._dirty = np.zeros(ids_arr.size, dtype=bool)
+
+                self._publish(ids_arr, lat_arr, lng_arr, tlat_arr, tlng_arr,
+                              going_arr, time.time())
+
+            logger.info(f"{len(ids)} planes loaded to memory")
+
+            self.rebuild_spatial_index()
+
         except Exception as e:
             logger.error(f"Error: planes not loaded: {e}")
-    
+
+    def _publish(self, ids, lat, lng, tlat, tlng, going, last_updated):
+        """Publish a new immutable snapshot (caller holds _writer_lock)"""
+        self._snapshot = (ids, lat, lng, tlat, tlng, going, last_updated)
+
+    def _refresh_target_trig(self, tlat, tlng, idx=None):
+        """
+        Recompute the cached target trig, fully or just for the planes in
+        idx whose targets changed (caller holds _writer_lock)
+        """
+        if idx is None:
+            self._tlat_rad = np.radians(tlat)
+            self._tlng_rad = np.radians(tlng)
+            self._sin_tlat = np.sin(self._tlat_rad)
+            self._cos_tlat = np.cos(self._tlat_rad)
+        else:
+            self._tlat_rad[idx] = np.radians(tlat[idx])
+            self._tlng_rad[idx] = np.radians(tlng[idx])
+            self._sin_tlat[idx] = np.sin(self._tlat_rad[idx])
+            self._cos_tlat[idx] = np.cos(self._tlat_rad[idx])
+
+    @staticmethod
+    def _index_of(ids, plane_id):
+        """Find a plane's array index via binary search (ids are sorted)"""
+        i = int(np.searchsorted(ids, plane_id))
+        if i < ids.size and ids[i] == plane_id:
+            return i
+        return None
+
+    def upsert_plane(self, plane):
+        """
+        Insert a new plane into memory, or refresh the route of an existing
+        one (called from the post_save signal) - planes created or edited
+        after startup take part in movement without a reload or DB polling
+        """
+        try:
+            lat = float(plane.current_position.y)
+            lng = float(plane.current_position.x)
+            slat = float(plane.start_point.y)
+            slng = float(plane.start_point.x)
+            elat = float(plane.end_point.y)
+            elng = float(plane.end_point.x)
+        except Exception as e:
+            logger.error(f"Error: plane {plane.id} not cached: {e}")
+            return
+
+        with self._writer_lock:
+            ids, alat, alng, tlat, tlng, going, last_updated = self._snapshot
+            i = self._index_of(ids, plane.id)
+
+            if i is not None:
+                # known plane - refresh endpoints and target, keep the live
+                # position from memory (it is fresher than the DB row)
+                self.start_lat[i] = slat
+                self.start_lng[i] = slng
+                self.end_lat[i] = elat
+                self.end_lng[i] = elng
+
+                tlat = tlat.copy()
+                tlng = tlng.copy()
+                going = going.copy()
+                going[i] = plane.is_going_to_end
+                tlat[i] = elat if plane.is_going_to_end else slat
+                tlng[i] = elng if plane.is_going_to_end else slng
+                self._refresh_target_trig(tlat, tlng, idx=i)
+
+                self._publish(ids, alat, alng, tlat, tlng, going, last_updated)
+            else:
+                # new plane - splice it into the sorted arrays
+                pos = int(np.searchsorted(ids, plane.id))
+
+                self.start_lat = np.insert(self.start_lat, pos, slat)
+                self.start_lng = np.insert(self.start_lng, pos, slng)
+                self.end_lat = np.insert(self.end_lat, pos, elat)
+                self.end_lng = np.insert(self.end_lng, pos, elng)
+                self._dirty = np.insert(self._dirty, pos, False)
+
+                tlat = np.insert(tlat, pos, elat if plane.is_going_to_end else slat)
+                tlng = np.insert(tlng, pos, elng if plane.is_going_to_end else slng)
+                self._tlat_rad = np.insert(self._tlat_rad, pos, 0.0)
+                self._tlng_rad = np.insert(self._tlng_rad, pos, 0.0)
+                self._sin_tlat = np.insert(self._sin_tlat, pos, 0.0)
+                self._cos_tlat = np.insert(self._cos_tlat, pos, 0.0)
+                self._refresh_target_trig(tlat, tlng, idx=pos)
+
+                self._publish(
+                    np.insert(ids, pos, plane.id),
+                    np.insert(alat, pos, lat),
+                    np.insert(alng, pos, lng),
+                    tlat, tlng,
+                    np.insert(going, pos, plane.is_going_to_end),
+                    last_updated
+                )
+
+                logger.info(f"Plane {plane.id} added to memory")
+
+    def remove_plane(self, plane_id: int):
+        """Drop a deleted plane from memory (called from the post_delete signal)"""
+        with self._writer_lock:
+            ids, lat, lng, tlat, tlng, going, last_updated = self._snapshot
+
+            if self._index_of(ids, plane_id) is None:
+                return
+
+            keep = ids != plane_id
+            self.start_lat = self.start_lat[keep]
+            self.start_lng = self.start_lng[keep]
+            self.end_lat = self.end_lat[keep]
+            self.end_lng = self.end_lng[keep]
+            self._tlat_rad = self._tlat_rad[keep]
+            self._tlng_rad = self._tlng_rad[keep]
+            self._sin_tlat = self._sin_tlat[keep]
+            self._cos_tlat = self._cos_tlat[keep]
+            self._dirty = self._dirty[keep]
+
+            self._publish(ids[keep], lat[keep], lng[keep], tlat[keep],
+                          tlng[keep], going[keep], last_updated)
+
+            logger.info(f"Plane {plane_id} removed from memory")
+
     def get_plane_position(self, plane_id: int) -> Optional[Dict]:
-        with self.positions_lock:
-            return self.plane_positions.get(plane_id)
-    
+        ids, lat, lng, tlat, tlng, going, last_updated = self._snapshot
+
+        i = self._index_of(ids, plane_id)
+        if i is None:
+            return None
+
+        return {
+            'current_lat': float(lat[i]),
+            'current_lng': float(lng[i]),
+            'target_lat': float(tlat[i]),
+            'target_lng': float(tlng[i]),
+            'is_going_to_end': bool(going[i]),
+            'last_updated': last_updated
+        }
+
     def get_all_positions(self) -> Dict[int, Dict]:
-        with self.positions_lock:
-            # return a copy, original dict is not modified
-            return dict(self.plane_positions)
-    
+        ids, lat, lng, tlat, tlng, going, last_updated = self._snapshot
+
+        # build the dicts from the immutable snapshot - no lock; tolist()
+        # converts each column once instead of boxing a NumPy scalar per
+        # element access
+        return {
+            plane_id: {
+                'current_lat': la,
+                'current_lng': ln,
+                'target_lat': ta,
+                'target_lng': tn,
+                'is_going_to_end': g,
+                'last_updated': last_updated
+            }
+            for plane_id, la, ln, ta, tn, g in zip(
+                ids.tolist(), lat.tolist(), lng.tolist(),
+                tlat.tolist(), tlng.tolist(), going.tolist()
+            )
+        }
+
     def get_positions_with_heading(self) -> Dict[int, Dict]:
-        with self.positions_lock:
-            result = {}
-            
-            for plane_id, pos in self.plane_positions.items():
-                # calculate heading
-                heading = calculate_bearing(
-                    pos['current_lat'], pos['current_lng'],
-                    pos['target_lat'], pos['target_lng']
-                )
-                
-                result[plane_id] = {
-                    'current_lat': pos['current_lat'],
-                    'current_lng': pos['current_lng'],
-                    'is_going_to_end': pos['is_going_to_end'],
-                    'heading': round(heading, 1),
-                    'last_updated': pos['last_updated']
-                }
-            
-            return result
-    
-    def update_positions(self):
-        """Update the positions of all planes"""
-        if not self.plane_positions:
+        ids, lat, lng, tlat, tlng, going, last_updated = self._snapshot
+
+        # headings for the whole fleet in one vectorized pass on the
+        # immutable snapshot - no lock, no per-plane trig
+        headings = np.round(calculate_bearings_vec(lat, lng, tlat, tlng), 1)
+
+        result = {}
+        for plane_id, la, ln, h, g in zip(
+            ids.tolist(), lat.tolist(), lng.tolist(),
+            headings.tolist(), going.tolist()
+        ):
+            result[plane_id] = {
+                'current_lat': la,
+                'current_lng': ln,
+                'is_going_to_end': g,
+                'heading': h,
+                'last_updated': last_updated
+            }
+
+        return result
+
+    def snapshot(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Columnar view of the fleet for bulk consumers:
+        (ids, lats, lngs, headings), sorted by plane id.
+        The coordinate arrays are the published snapshot itself and the
+        headings are computed once per snapshot and cached - callers must
+        treat all four arrays as read-only
+        """
+        snap = self._snapshot
+        ids, lat, lng, tlat, tlng = snap[0], snap[1], snap[2], snap[3], snap[4]
+
+        cached = self._heading_cache
+        if cached is not None and cached[0] is snap:
+            return ids, lat, lng, cached[1]
+
+        headings = np.round(calculate_bearings_vec(lat, lng, tlat, tlng), 1)
+        self._heading_cache = (snap, headings)
+        return ids, lat, lng, headings
+
+    @staticmethod
+    def pack_positions_frame(ids, lngs, lats, headings, going, filter_info, timestamp):
+        """
+        Pack a positions tick as a binary frame:
+        4-byte big-endian header length + JSON header + packed records.
+        The numeric columns are memcpy'd into one contiguous buffer - no
+        per-plane dict, no JSON row per plane
+        """
+        records = np.empty(len(ids), dtype=POSITION_RECORD)
+        records['id'] = ids
+        records['lng'] = lngs
+        records['lat'] = lats
+        records['heading'] = headings
+        records['going'] = going
+
+        header = orjson.dumps({
+            'type': 'positions_update',
+            'timestamp': timestamp,
+            'count': int(records.size),
+            'filters': filter_info
+        })
+
+        return len(header).to_bytes(4, 'big') + header + records.tobytes()
+
+    def get_positions_packed(self, timestamp) -> bytes:
+        """
+        Whole-fleet positions frame built straight from the snapshot columns
+        (vectorized headings, no intermediate dicts), cached per tick so all
+        unfiltered clients share a single buffer
+        """
+        cached = self._packed_frame
+        if cached is not None and cached[0] == timestamp:
+            return cached[1]
+
+        # single atomic snapshot load so the direction column lines up with
+        # the coordinates; the heading cache is shared with snapshot()
+        snap = self._snapshot
+        ids, lat, lng, going = snap[0], snap[1], snap[2], snap[5]
+
+        cached_headings = self._heading_cache
+        if cached_headings is not None and cached_headings[0] is snap:
+            headings = cached_headings[1]
+        else:
+            headings = np.round(calculate_bearings_vec(lat, lng, snap[3], snap[4]), 1)
+            self._heading_cache = (snap, headings)
+
+        frame = self.pack_positions_frame(ids, lng, lat, headings, going, None, timestamp)
+        self._packed_frame = (timestamp, frame)
+        return frame
+
+    def refresh_plane_meta(self):
+        """Reload the plane id -> (name, pilot_name) cache from database"""
+        try:
+            # values_list skips Plane/Pilot model instantiation for all rows,
+            # iterator() streams them through a server-side cursor
+            meta = {
+                plane_id: (name, pilot_name or 'Pilot Yok')
+                for plane_id, name, pilot_name in Plane.objects.values_list(
+                    'id', 'name', 'pilot__name'
+                ).iterator(chunk_size=2000)
+            }
+
+            # atomic swap, readers never see a half-built dict
+            self._plane_meta = meta
+            self._plane_meta_stale = False
+
+            logger.info(f"{len(meta)} plane metadata entries cached")
+
+        except Exception as e:
+            logger.error(f"Error: plane metadata not cached: {e}")
+
+    def invalidate_plane_meta(self):
+        """Mark the metadata cache stale (refreshed on the next movement tick)"""
+        self._plane_meta_stale = True
+
+    def get_plane_meta(self) -> Dict[int, Tuple[str, str]]:
+        return self._plane_meta
+
+    @staticmethod
+    def _index_properties():
+        """R-tree node sizing for point-only bulk loads"""
+        props = rtree_index.Property()
+        props.leaf_capacity = 64
+        props.index_capacity = 64
+        return props
+
+    def rebuild_spatial_index(self):
+        """Rebuild the R-tree index from current positions"""
+        if rtree_index is None:
             return
-        
-        updated_count = 0
-        
-        with self.positions_lock:
-            current_time = time.time()
-            
-            for plane_id, pos in list(self.plane_positions.items()):
-                try:
-                    # move from current position to target
-                    new_lat, new_lng, reached_target = move_towards_target(
-                        pos['current_lat'], pos['current_lng'],
-                        pos['target_lat'], pos['target_lng'],
-                        self.MOVEMENT_DISTANCE
-                    )
-                    
-                    # update position
-                    pos['current_lat'] = new_lat
-                    pos['current_lng'] = new_lng
-                    pos['last_updated'] = current_time
-                    
-                    # if reached the target, change direction
-                    if reached_target:
-                        pos['is_going_to_end'] = not pos['is_going_to_end']
-                        
-                        # set new target
-                        if pos['is_going_to_end']:
-                            # now going to end
-                            try:
-                                plane = Plane.objects.get(id=plane_id)
-                                pos['target_lat'] = float(plane.end_point.y)
-                                pos['target_lng'] = float(plane.end_point.x)
-                            except ObjectDoesNotExist:
-                                logger.warning(f"Plane {plane_id} not found, removing from memory")
-                                del self.plane_positions[plane_id]
-                                continue
-                        else:
-                            # now going to start
-                            try:
-                                plane = Plane.objects.get(id=plane_id)
-                                pos['target_lat'] = float(plane.start_point.y)
-                                pos['target_lng'] = float(plane.start_point.x)
-                            except ObjectDoesNotExist:
-                                logger.warning(f"Plane {plane_id} not found, removing from memory")
-                                del self.plane_positions[plane_id]
-                                continue
-                        
-                        logger.debug(f" Plane {plane_id} reached target, direction changed: {'end' if pos['is_going_to_end'] else 'start'}")
-                    
-                    updated_count += 1
-                    
-                except Exception as e:
-                    logger.error(f"Error: plane {plane_id} not updated: {e}")
-        
-        if updated_count > 0:
-            logger.debug(f"{updated_count} planes updated")
+
+        try:
+            # single atomic snapshot load - indices stay consistent
+            snap = self._snapshot
+            ids, lats, lngs = snap[0], snap[1], snap[2]
+
+            entries = [
+                (plane_id, (lng, lat, lng, lat), None)
+                for plane_id, lng, lat in zip(
+                    ids.tolist(), lngs.tolist(), lats.tolist()
+                )
+            ]
+
+            # sort by Hilbert curve position so the packed bulk-load produces
+            # low-overlap nodes (fewer subtree descents per query)
+            entries.sort(key=lambda e: hilbert_key(e[1][0], e[1][1]))
+
+            # generator bulk-load is ~10x faster than incremental insert/delete,
+            # readers keep using the old index until the swap below
+            self.spatial_index = rtree_index.Index(entries, properties=self._index_properties())
+
+        except Exception as e:
+            logger.error(f"Error: spatial index not rebuilt: {e}")
+
+    def query_bbox(self, min_lng, min_lat, max_lng, max_lat):
+        """Return candidate plane ids inside the bounding box (broad phase)"""
+        idx = self.spatial_index
+        if idx is None:
+            return None
+        return list(idx.intersection((min_lng, min_lat, max_lng, max_lat)))
+
+    def update_positions(self, rebuild_index: bool = True):
+        """Update the positions of all planes - one vectorized pass"""
+        with self._writer_lock:
+            ids, lat, lng, tlat, tlng, going, _ = self._snapshot
+            if ids.size == 0:
+                return
+
+            try:
+                # move the whole fleet in a single NumPy call; planes within
+                # one step of their target are snapped onto it
+                new_lat, new_lng, reached = move_towards_target_vec(
+                    lat, lng, tlat, tlng, self.MOVEMENT_DISTANCE,
+                    tlat_rad=self._tlat_rad, tlng_rad=self._tlng_rad,
+                    sin_tlat=self._sin_tlat, cos_tlat=self._cos_tlat,
+                    sin_ang=self._sin_step, cos_ang=self._cos_step
+                )
+
+            except Exception as e:
+                logger.error(f"Error: positions not updated: {e}")
+                return
+
+            # planes that reached their target flip direction and swap targets
+            # from the cached endpoint arrays - copy before modify, the
+            # published arrays are never mutated
+            reached_idx = np.flatnonzero(reached)
+            if reached_idx.size > 0:
+                going = going.copy()
+                tlat = tlat.copy()
+                tlng = tlng.copy()
+
+                going[reached_idx] = ~going[reached_idx]
+                flipped = going[reached_idx]
+                tlat[reached_idx] = np.where(
+                    flipped, self.end_lat[reached_idx], self.start_lat[reached_idx]
+                )
+                tlng[reached_idx] = np.where(
+                    flipped, self.end_lng[reached_idx], self.start_lng[reached_idx]
+                )
+                self._refresh_target_trig(tlat, tlng, idx=reached_idx)
+                logger.debug(f"{reached_idx.size} planes reached target, direction changed")
+
+            # mark planes whose persisted state changed since the last flush
+            changed = (new_lat != lat) | (new_lng != lng)
+            if reached_idx.size > 0:
+                changed[reached_idx] = True  # is_going_to_end flipped
+            self._dirty |= changed
+
+            # atomic publish - readers switch to the new snapshot as a whole
+            self._publish(ids, new_lat, new_lng, tlat, tlng, going, time.time())
+
+            updated_count = ids.size
+
+        logger.debug(f"{updated_count} planes updated")
+
+        # refresh the spatial index with the new positions (the async loop
+        # opts out and rebuilds in an executor instead)
+        if rebuild_index:
+            self.rebuild_spatial_index()
     
-    def save_to_database(self):
-        """Save positions in memory to database"""
-        if not self.plane_positions:
-            return
-        
-        saved_count = 0
-        
+    def save_to_database(self, max_rows: Optional[int] = None):
+        """Save positions in memory to database (at most max_rows of them)"""
+        # grab the snapshot and drain the dirty mask together under the
+        # writer lock so the mask indices line up with the arrays; only
+        # planes that actually changed since the last flush get written.
+        # When max_rows caps the flush, a cursor rotates through the fleet
+        # so successive capped flushes cover different planes instead of
+        # rewriting the same rows every poll
+        with self._writer_lock:
+            snap = self._snapshot
+            if snap[0].size == 0 or not self._dirty.any():
+                return
+            idx = np.flatnonzero(self._dirty)
+            if max_rows is not None and idx.size > max_rows:
+                start = int(np.searchsorted(idx, self._flush_cursor))
+                idx = np.concatenate((idx[start:], idx[:start]))[:max_rows]
+                self._flush_cursor = int(idx[-1]) + 1
+            else:
+                self._flush_cursor = 0
+            self._dirty[idx] = False
+            self._last_flush = time.time()
+
+        ids = snap[0][idx].tolist()
+        lats = snap[1][idx].tolist()
+        lngs = snap[2][idx].tolist()
+        going = snap[5][idx].tolist()
+
         try:
+            # bulk_update only needs PKs - one statement per batch instead
+            # of a SELECT + UPDATE round-trip per plane
+            planes = [
+                Plane(
+                    id=plane_id,
+                    current_position=Point(lng, lat, srid=4326),
+                    is_going_to_end=g
+                )
+                for plane_id, lat, lng, g in zip(ids, lats, lngs, going)
+            ]
+
             with transaction.atomic():
-                with self.positions_lock:
-                    for plane_id, pos in self.plane_positions.items():
-                        try:
-                            from django.contrib.gis.geos import Point
-                            plane = Plane.objects.get(id=plane_id)
-                            plane.current_position = Point(pos['current_lng'], pos['current_lat'], srid=4326)
-                            plane.is_going_to_end = pos['is_going_to_end']
-                            plane.save(update_fields=['current_position', 'is_going_to_end'])
-                            saved_count += 1
-                            
-                        except ObjectDoesNotExist:
-                            logger.warning(f"Plane {plane_id} not found, removing from memory")
-                            del self.plane_positions[plane_id]
-                        except Exception as e:
-                            logger.error(f"Error: plane {plane_id} not saved: {e}")
-            
-            logger.info(f"{saved_count} planes saved to database")
-            
+                Plane.objects.bulk_update(
+                    planes,
+                    ['current_position', 'is_going_to_end'],
+                    batch_size=1000
+                )
+
+            logger.info(f"{len(planes)} planes saved to database")
+
         except Exception as e:
+            # flush failed - put the dirty bits back so the next run retries
+            # (skip if the fleet was reloaded/resized in the meantime)
+            with self._writer_lock:
+                if self._dirty.size == snap[0].size:
+                    self._dirty[idx] = True
+
             logger.error(f"Error: planes not saved to database: {e}")
     
     def movement_loop(self):
@@ -192,39 +642,111 @@ class MovementManager:
         while self.running:
             try:
                 start_time = time.time()
-                
+
                 # update positions
                 self.update_positions()
+
+                # refresh metadata cache if a signal invalidated it
+                if self._plane_meta_stale:
+                    self.refresh_plane_meta()
                 
                 # calculate elapsed time and dynamic sleep
                 elapsed_time = time.time() - start_time
                 sleep_time = self.MOVEMENT_INTERVAL - elapsed_time
                 
                 # if process takes more than 2 seconds, sleep
+                # (wait() returns True as soon as stop() sets the event)
                 if sleep_time > 0:
-                    time.sleep(sleep_time)
+                    if self._stop_event.wait(sleep_time):
+                        break
                 # Performance warning
                 elif elapsed_time > self.MOVEMENT_INTERVAL + 0.5:  # 0.5s tolerance
                     logger.warning(f" Calculating plane positions is slow: {elapsed_time:.3f}s (target: {self.MOVEMENT_INTERVAL}s)")
-                
+
             except Exception as e:
                 logger.error(f"Movement loop error: {e}")
-                time.sleep(0.1)  # short sleep and continue
+                self._stop_event.wait(0.1)  # short sleep and continue
     
+    def _flush_due(self) -> bool:
+        """Dual-trigger flush check: enough dirty rows, or the flush is overdue"""
+        dirty_count = int(self._dirty.sum())
+        if dirty_count == 0:
+            return False
+
+        return (dirty_count > self.DB_SAVE_BATCH_THRESHOLD or
+                time.time() - self._last_flush >= self.DB_SAVE_INTERVAL)
+
     def db_save_loop(self):
-        """Database save loop (runs every 2 minutes)"""
+        """Database save loop (dual-trigger: batch size or flush age)"""
         logger.info("Database save loop started")
-        
+
         while self.running:
             try:
-                time.sleep(self.DB_SAVE_INTERVAL)
-                if self.running:  # if still running, save
-                    self.save_to_database()
-                    
+                # wait() doubles as the poll sleep and the shutdown signal -
+                # stop() wakes the loop immediately instead of after the poll
+                if self._stop_event.wait(self.DB_SAVE_POLL):
+                    break
+                if self._flush_due():
+                    self.save_to_database(max_rows=self.DB_SAVE_BATCH_THRESHOLD)
+
             except Exception as e:
                 logger.error(f"Database save loop error: {e}")
-                time.sleep(10)  # short sleep and continue
-    
+                self._stop_event.wait(10)  # short sleep and continue
+
+    async def _movement_loop_async(self):
+        """Main movement loop as an asyncio task - runs every 2 seconds"""
+        logger.info("Movement loop started (asyncio)")
+        loop = asyncio.get_running_loop()
+
+        while self.running:
+            try:
+                start_time = loop.time()
+
+                # the vectorized update is DB-free, it runs inline on the
+                # loop; the index rebuild is pure-Python heavy (per-plane
+                # Hilbert keys plus the R-tree bulk load), so it goes to the
+                # thread pool - the atomic swap makes an off-loop rebuild safe
+                self.update_positions(rebuild_index=False)
+                await loop.run_in_executor(None, self.rebuild_spatial_index)
+
+                # refresh metadata cache if a signal invalidated it
+                if self._plane_meta_stale:
+                    await database_sync_to_async(self.refresh_plane_meta)()
+
+                elapsed_time = loop.time() - start_time
+
+                # Performance warning
+                if elapsed_time > self.MOVEMENT_INTERVAL + 0.5:  # 0.5s tolerance
+                    logger.warning(f" Calculating plane positions is slow: {elapsed_time:.3f}s (target: {self.MOVEMENT_INTERVAL}s)")
+
+                await asyncio.sleep(max(0.0, self.MOVEMENT_INTERVAL - elapsed_time))
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Movement loop error: {e}")
+                await asyncio.sleep(0.1)  # short sleep and continue
+
+    async def _db_save_loop_async(self):
+        """Database save loop as an asyncio task (dual-trigger: batch size or flush age)"""
+        logger.info("Database save loop started (asyncio)")
+
+        while self.running:
+            try:
+                await asyncio.sleep(self.DB_SAVE_POLL)
+                if self.running and self._flush_due():
+                    # the DB write runs in the worker thread pool, the
+                    # event loop is never blocked behind it
+                    await database_sync_to_async(self.save_to_database)(
+                        max_rows=self.DB_SAVE_BATCH_THRESHOLD
+                    )
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Database save loop error: {e}")
+                await asyncio.sleep(10)  # short sleep and continue
+
     def start(self):
         """Start the movement system"""
         if self.running:
@@ -235,17 +757,53 @@ class MovementManager:
         
         # load planes from database
         self.load_planes_from_db()
-        
-        # start threads
+        self.refresh_plane_meta()
+
         self.running = True
-        
+        self._stop_event.clear()
+
+        # start() runs from AppConfig.ready() during django.setup(), before
+        # the ASGI server has an event loop - so the workers always begin
+        # as threads; attach_to_loop() migrates them onto the loop once
+        # ASGI code provides one
         self.movement_thread = threading.Thread(target=self.movement_loop, daemon=True)
         self.movement_thread.start()
-        
+
         self.db_save_thread = threading.Thread(target=self.db_save_loop, daemon=True)
         self.db_save_thread.start()
-        
+
         logger.info("MovementManager started successfully")
+
+    def attach_to_loop(self):
+        """
+        Migrate the workers from the startup threads onto the running event
+        loop. Called from ASGI code (first websocket connect) - asyncio
+        tasks cost no context switches or GIL handoffs against the
+        consumers, and DB work goes through the worker thread pool
+        """
+        if not self.running or self._movement_task is not None:
+            return
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        # wind down the thread workers - they wake from their waits
+        # immediately on the stop event
+        self._stop_event.set()
+        if self.movement_thread and self.movement_thread.is_alive():
+            self.movement_thread.join(timeout=5)
+        if self.db_save_thread and self.db_save_thread.is_alive():
+            self.db_save_thread.join(timeout=5)
+        self.movement_thread = None
+        self.db_save_thread = None
+        self._stop_event.clear()
+
+        self._movement_task = loop.create_task(self._movement_loop_async())
+        self._db_save_task = loop.create_task(self._db_save_loop_async())
+
+        logger.info("MovementManager workers attached to the event loop")
     
     def stop(self):
         """Stop the movement system"""
@@ -256,7 +814,17 @@ class MovementManager:
         logger.info("MovementManager is stopping...")
         
         self.running = False
-        
+        self._stop_event.set()  # wakes the thread loops out of their waits
+
+        # cancel asyncio workers
+        if self._movement_task is not None:
+            self._movement_task.cancel()
+            self._movement_task = None
+
+        if self._db_save_task is not None:
+            self._db_save_task.cancel()
+            self._db_save_task = None
+
         # wait for threads to finish
         if self.movement_thread and self.movement_thread.is_alive():
             self.movement_thread.join(timeout=5)
@@ -271,14 +839,19 @@ class MovementManager:
     
     def update_plane_target(self, plane_id: int, new_target_lat: float, new_target_lng: float):
         """Update the target of a specific plane immediately (when command is accepted)"""
-        with self.positions_lock:
-            if plane_id in self.plane_positions:
-                plane_data = self.plane_positions[plane_id]
-                
-                # set new target
-                plane_data['target_lat'] = new_target_lat
-                plane_data['target_lng'] = new_target_lng
-                
+        with self._writer_lock:
+            ids, lat, lng, tlat, tlng, going, last_updated = self._snapshot
+
+            i = self._index_of(ids, plane_id)
+            if i is not None:
+                # copy-modify-publish: the published arrays stay immutable
+                tlat = tlat.copy()
+                tlng = tlng.copy()
+                tlat[i] = new_target_lat
+                tlng[i] = new_target_lng
+                self._refresh_target_trig(tlat, tlng, idx=i)
+                self._publish(ids, lat, lng, tlat, tlng, going, last_updated)
+
                 logger.info(f"New target set for Plane {plane_id}: {new_target_lat}, {new_target_lng}")
                 return True
             else:
@@ -288,4 +861,28 @@ class MovementManager:
 
 
 # Global instance
-movement_manager = MovementManager() 
\ No newline at end of file
+movement_manager = MovementManager()
+
+
+def _invalidate_plane_meta(sender, **kwargs):
+    """Plane/Pilot changed, metadata cache is stale"""
+    movement_manager.invalidate_plane_meta()
+
+
+def _remove_deleted_plane(sender, instance, **kwargs):
+    """Plane deleted, drop it from the in-memory arrays as well"""
+    movement_manager.remove_plane(instance.id)
+
+
+def _upsert_saved_plane(sender, instance, **kwargs):
+    """Plane created or edited, sync it into the in-memory arrays"""
+    movement_manager.upsert_plane(instance)
+
+
+post_delete.connect(_remove_deleted_plane, sender=Plane, dispatch_uid='fleet_plane_positions_delete')
+post_save.connect(_upsert_saved_plane, sender=Plane, dispatch_uid='fleet_plane_positions_save')
+
+post_save.connect(_invalidate_plane_meta, sender=Plane, dispatch_uid='fleet_plane_meta_save')
+post_delete.connect(_invalidate_plane_meta, sender=Plane, dispatch_uid='fleet_plane_meta_delete')
+post_save.connect(_invalidate_plane_meta, sender=Pilot, dispatch_uid='fleet_pilot_meta_save')
+post_delete.connect(_invalidate_plane_meta, sender=Pilot, dispatch_uid='fleet_pilot_meta_delete') 
\ No newline at end of file
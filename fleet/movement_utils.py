@@ -5,7 +5,27 @@ Math functions for plane movement calculations
 
 import math
 
+import numpy as np
 
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+
+def _maybe_njit(fn):
+    """
+    JIT-compile a scalar math kernel with numba when it is installed,
+    leave the pure-Python version in place otherwise
+    fastmath lets LLVM fuse/reassociate the trig chains; cache=True
+    persists the compiled code across process restarts
+    """
+    if njit is None:
+        return fn
+    return njit(cache=True, fastmath=True)(fn)
+
+
+@_maybe_njit
 def calculate_distance(lat1, lng1, lat2, lng2):
     """
     Calculate the distance between two coordinates (in meters)
@@ -18,15 +38,88 @@ def calculate_distance(lat1, lng1, lat2, lng2):
     dlat_rad = math.radians(lat2 - lat1)
     dlng_rad = math.radians(lng2 - lng1)
     
-    a = (math.sin(dlat_rad / 2) ** 2 + 
-         math.cos(lat1_rad) * math.cos(lat2_rad) * 
+    a = (math.sin(dlat_rad / 2) ** 2 +
+         math.cos(lat1_rad) * math.cos(lat2_rad) *
          math.sin(dlng_rad / 2) ** 2)
-    
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    
+
+    # asin form of the haversine: one sqrt instead of the two the
+    # atan2(sqrt(a), sqrt(1-a)) form needs, same result for a in [0, 1]
+    c = 2 * math.asin(math.sqrt(a))
+
     return R * c  # meters
 
 
+def haversine_distances(lats, lngs, center_lat, center_lng):
+    """
+    Vectorized Haversine over NumPy coordinate arrays (in meters)
+    Same formula as calculate_distance, computed for the whole fleet at once
+    """
+    R = 6371000  # Earth radius in meters
+
+    dlat_rad = np.radians(lats - center_lat)
+    dlng_rad = np.radians(lngs - center_lng)
+
+    a = (np.sin(dlat_rad / 2) ** 2 +
+         np.cos(np.radians(center_lat)) * np.cos(np.radians(lats)) *
+         np.sin(dlng_rad / 2) ** 2)
+
+    return 2 * R * np.arcsin(np.sqrt(a))  # meters
+
+
+def equirectangular_mask(lats, lngs, center_lat, center_lng, radius_m):
+    """
+    Vectorized radius filter using the equirectangular approximation
+    Accurate to fractions of a percent for small radii away from the poles,
+    and needs only one cosine total (no per-plane asin/atan2, no sqrt since
+    both sides are compared squared)
+    """
+    R = 6371000  # Earth radius in meters
+
+    cos_lat0 = math.cos(math.radians(center_lat))
+    # wrap the longitude delta into [-180, 180] so a center near the
+    # antimeridian still sees planes just across the seam
+    dlng = np.remainder(lngs - center_lng + 180.0, 360.0) - 180.0
+    dx = np.radians(dlng) * cos_lat0
+    dy = np.radians(lats - center_lat)
+
+    return (dx * dx + dy * dy) * (R * R) <= radius_m * radius_m
+
+
+def hilbert_key(lng, lat, order=16):
+    """
+    Map a coordinate onto the Hilbert curve (2^order x 2^order grid)
+    Used to sort planes spatially before bulk-loading the R-tree:
+    neighbours on the curve end up in the same tree node, which keeps
+    node bounding boxes small and queries fast
+    """
+    n = 1 << order
+
+    # normalize lng/lat into grid cells
+    x = int((lng + 180.0) / 360.0 * (n - 1))
+    y = int((lat + 90.0) / 180.0 * (n - 1))
+
+    rx = ry = 0
+    d = 0
+    s = n >> 1
+
+    while s > 0:
+        rx = 1 if (x & s) > 0 else 0
+        ry = 1 if (y & s) > 0 else 0
+        d += s * s * ((3 * rx) ^ ry)
+
+        # rotate the quadrant
+        if ry == 0:
+            if rx == 1:
+                x = s - 1 - x
+                y = s - 1 - y
+            x, y = y, x
+
+        s >>= 1
+
+    return d
+
+
+@_maybe_njit
 def calculate_bearing(lat1, lng1, lat2, lng2):
     """
     Calculate the bearing (direction angle) between two points
@@ -35,57 +128,266 @@ def calculate_bearing(lat1, lng1, lat2, lng2):
     lat1_rad = math.radians(lat1)
     lat2_rad = math.radians(lat2)
     dlng_rad = math.radians(lng2 - lng1)
-    
-    y = math.sin(dlng_rad) * math.cos(lat2_rad)
-    x = (math.cos(lat1_rad) * math.sin(lat2_rad) - 
-         math.sin(lat1_rad) * math.cos(lat2_rad) * math.cos(dlng_rad))
-    
-    bearing_rad = math.atan2(y, x)
-    bearing_deg = math.degrees(bearing_rad)
-    
-    # normalize to 0-360 degrees
-    return (bearing_deg + 360) % 360
 
+    # take the sin/cos of each angle exactly once
+    sin_lat1 = math.sin(lat1_rad)
+    cos_lat1 = math.cos(lat1_rad)
+    sin_lat2 = math.sin(lat2_rad)
+    cos_lat2 = math.cos(lat2_rad)
+
+    y = math.sin(dlng_rad) * cos_lat2
+    x = cos_lat1 * sin_lat2 - sin_lat1 * cos_lat2 * math.cos(dlng_rad)
+
+    bearing_deg = math.degrees(math.atan2(y, x))
+
+    # atan2 lands in [-180, 180]: adding 360 to negatives normalizes to
+    # 0-360 without the float modulo
+    return bearing_deg + 360.0 if bearing_deg < 0 else bearing_deg
+
+
+def calculate_bearings_vec(lats, lngs, tlats, tlngs):
+    """
+    Vectorized calculate_bearing over NumPy coordinate arrays
+    Result: 0-360 degrees per plane (0=North, 90=East, 180=South, 270=West)
+    """
+    lat1 = np.radians(lats)
+    lat2 = np.radians(tlats)
+    dlng = np.radians(tlngs - lngs)
+
+    cos_lat2 = np.cos(lat2)
+    y = np.sin(dlng) * cos_lat2
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * cos_lat2 * np.cos(dlng)
+
+    bearing = np.degrees(np.arctan2(y, x))
+
+    # arctan2 lands in [-180, 180]: np.where beats a float modulo
+    return np.where(bearing < 0, bearing + 360.0, bearing)
 
+
+@_maybe_njit
 def move_distance_with_bearing(lat, lng, distance_meters, bearing_degrees):
     """
     Calculate the new coordinate from a specific point, distance, and direction
-    
+
     """
     R = 6371000  # Earth radius in meters
     
     lat_rad = math.radians(lat)
     lng_rad = math.radians(lng)
     bearing_rad = math.radians(bearing_degrees)
-    
-    # Spherical trigonometry
+
+    # Spherical trigonometry - sin/cos of each angle computed once
+    ang = distance_meters / R
+    sin_ang = math.sin(ang)
+    cos_ang = math.cos(ang)
+    sin_lat = math.sin(lat_rad)
+    cos_lat = math.cos(lat_rad)
+
     new_lat_rad = math.asin(
-        math.sin(lat_rad) * math.cos(distance_meters / R) +
-        math.cos(lat_rad) * math.sin(distance_meters / R) * math.cos(bearing_rad)
+        sin_lat * cos_ang + cos_lat * sin_ang * math.cos(bearing_rad)
     )
-    
+
     new_lng_rad = lng_rad + math.atan2(
-        math.sin(bearing_rad) * math.sin(distance_meters / R) * math.cos(lat_rad),
-        math.cos(distance_meters / R) - math.sin(lat_rad) * math.sin(new_lat_rad)
+        math.sin(bearing_rad) * sin_ang * cos_lat,
+        cos_ang - sin_lat * math.sin(new_lat_rad)
     )
-    
+
     return math.degrees(new_lat_rad), math.degrees(new_lng_rad)
 
 
+@_maybe_njit
 def move_towards_target(current_lat, current_lng, target_lat, target_lng, distance_meters):
     """
     Move towards the target with a certain distance from the current position
     If the remaining distance is less than the movement distance, go directly to the target
     """
-    # remaining distance to the target
+    # wrap the longitude delta into [-pi, pi] - a target just across the
+    # antimeridian is nearby, not a full world away (sin^2 in the haversine
+    # is wrap-invariant, the plain delta below is not)
+    dlng = math.radians(target_lng - current_lng)
+    if dlng > math.pi:
+        dlng -= 2.0 * math.pi
+    elif dlng < -math.pi:
+        dlng += 2.0 * math.pi
+
+    # cheap equirectangular screen first: at step scale it is accurate to
+    # fractions of a percent, and far from the target (the common case)
+    # it answers "keep moving" with half the trig of a full haversine
+    approx = 6371000.0 * math.hypot(
+        dlng * math.cos(math.radians(current_lat)),
+        math.radians(target_lat - current_lat)
+    )
+
+    if approx > distance_meters * 1.05:
+        # clearly out of reach this step - normal movement
+        bearing = calculate_bearing(current_lat, current_lng, target_lat, target_lng)
+        new_lat, new_lng = move_distance_with_bearing(current_lat, current_lng, distance_meters, bearing)
+        return new_lat, new_lng, False
+
+    # near the target - let the exact haversine distance decide
     remaining_distance = calculate_distance(current_lat, current_lng, target_lat, target_lng)
-    
-    # if the remaining distance is less than the movement distance, go directly to the target
+
     if remaining_distance <= distance_meters:
         return target_lat, target_lng, True
-    
-    # normal movement
+
     bearing = calculate_bearing(current_lat, current_lng, target_lat, target_lng)
     new_lat, new_lng = move_distance_with_bearing(current_lat, current_lng, distance_meters, bearing)
-    
+
     return new_lat, new_lng, False
+
+
+def move_towards_target_vec(lats, lngs, tlats, tlngs, distance_meters,
+                            tlat_rad=None, tlng_rad=None,
+                            sin_tlat=None, cos_tlat=None,
+                            sin_ang=None, cos_ang=None):
+    """
+    Vectorized move_towards_target over the whole fleet at once
+    Same haversine + bearing + spherical step as the scalar version, but
+    computed as a handful of NumPy ufunc passes over contiguous arrays
+    instead of per-plane Python trig calls
+
+    Targets change rarely (direction flips, accepted commands), so callers
+    can pass precomputed target-side trig arrays and skip the per-tick
+    radians/sin/cos of the target coordinates
+
+    Returns (new_lats, new_lngs, reached) arrays; planes that reached
+    their target are snapped onto it
+    """
+    R = 6371000.0  # Earth radius in meters
+
+    # target-side trig: reuse the caller's cache or compute on the fly
+    if tlat_rad is None:
+        tlat_rad = np.radians(tlats)
+        tlng_rad = np.radians(tlngs)
+    if sin_tlat is None:
+        sin_tlat = np.sin(tlat_rad)
+        cos_tlat = np.cos(tlat_rad)
+
+    # step-angle trig: distance_meters / R is fixed for a constant step
+    # size, so callers can fold its sin/cos once per process instead of
+    # once per tick
+    if sin_ang is None:
+        ang = distance_meters / R
+        sin_ang = math.sin(ang)
+        cos_ang = math.cos(ang)
+
+    # fused native kernel: one multi-core loop over the fleet, no
+    # intermediate arrays at all
+    if _move_fleet_fused is not None:
+        new_lats = np.empty_like(lats)
+        new_lngs = np.empty_like(lngs)
+        reached = np.empty(lats.shape, dtype=np.bool_)
+        _move_fleet_fused(lats, lngs, tlat_rad, tlng_rad, sin_tlat, cos_tlat,
+                          tlats, tlngs, float(distance_meters),
+                          sin_ang, cos_ang,
+                          new_lats, new_lngs, reached)
+        return new_lats, new_lngs, reached
+
+    lat1 = np.radians(lats)
+    lng1 = np.radians(lngs)
+    sin_lat1 = np.sin(lat1)
+    cos_lat1 = np.cos(lat1)
+
+    dlat = tlat_rad - lat1
+    # wrap the longitude delta into [-pi, pi] so targets just across the
+    # antimeridian read as nearby; the trig below is periodic, so the
+    # wrapped delta feeds the bearing unchanged
+    dlng = np.remainder(tlng_rad - lng1 + np.pi, 2.0 * np.pi) - np.pi
+
+    # cheap equirectangular reachability screen: planes more than one step
+    # away (with 5% margin) cannot reach their target this tick, so the
+    # exact haversine only runs on the small near-target subset
+    approx = R * np.hypot(dlng * cos_lat1, dlat)
+
+    reached = np.zeros(approx.shape, dtype=bool)
+    near = np.flatnonzero(approx <= distance_meters * 1.05)
+    if near.size > 0:
+        a = (np.sin(dlat[near] / 2) ** 2 +
+             cos_lat1[near] * cos_tlat[near] *
+             np.sin(dlng[near] / 2) ** 2)
+        remaining = 2 * R * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+        reached[near] = remaining <= distance_meters
+
+    # bearing towards the targets - the trailing ufuncs write into buffers
+    # that are no longer needed, saving a temporary array per step
+    sin_dlng = np.sin(dlng)
+    cos_dlng = np.cos(dlng, out=dlng)
+    y = np.multiply(sin_dlng, cos_tlat, out=sin_dlng)
+    x = cos_lat1 * sin_tlat
+    x -= sin_lat1 * cos_tlat * cos_dlng
+    bearing = np.arctan2(y, x, out=y)
+
+    # spherical move by distance_meters along the bearing
+    new_lat_rad = np.arcsin(
+        sin_lat1 * cos_ang +
+        cos_lat1 * sin_ang * np.cos(bearing)
+    )
+    new_lng_rad = lng1 + np.arctan2(
+        np.sin(bearing) * sin_ang * cos_lat1,
+        cos_ang - sin_lat1 * np.sin(new_lat_rad)
+    )
+
+    # snap planes that are within one step onto their target
+    new_lats = np.where(reached, tlats, np.degrees(new_lat_rad))
+    new_lngs = np.where(reached, tlngs, np.degrees(new_lng_rad))
+
+    return new_lats, new_lngs, reached
+
+
+if njit is not None:
+    @njit(cache=True, fastmath=True, parallel=True)
+    def _move_fleet_fused(lats, lngs, tlat_rad, tlng_rad, sin_tlat, cos_tlat,
+                          tlats, tlngs, distance_meters, sin_ang, cos_ang,
+                          out_lat, out_lng, out_reached):
+        """
+        Fused movement kernel: screen + haversine + bearing + spherical step
+        inlined into one parallel loop over the fleet. Avoids the temporary
+        array per ufunc of the NumPy path and spreads the work over cores
+        via prange - the nearest equivalent of a hand-written C/OpenMP
+        extension without a compile step at install time
+        """
+        R = 6371000.0
+        margin = distance_meters * 1.05
+
+        for i in prange(lats.shape[0]):
+            lat1 = math.radians(lats[i])
+            lng1 = math.radians(lngs[i])
+            sin_lat1 = math.sin(lat1)
+            cos_lat1 = math.cos(lat1)
+
+            dlat = tlat_rad[i] - lat1
+            # wrap across the antimeridian (see move_towards_target_vec)
+            dlng = tlng_rad[i] - lng1
+            if dlng > math.pi:
+                dlng -= 2.0 * math.pi
+            elif dlng < -math.pi:
+                dlng += 2.0 * math.pi
+
+            # equirectangular screen, exact haversine only when near
+            reached = False
+            if R * math.hypot(dlng * cos_lat1, dlat) <= margin:
+                a = (math.sin(dlat / 2) ** 2 +
+                     cos_lat1 * cos_tlat[i] * math.sin(dlng / 2) ** 2)
+                remaining = 2 * R * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+                reached = remaining <= distance_meters
+
+            if reached:
+                out_lat[i] = tlats[i]
+                out_lng[i] = tlngs[i]
+            else:
+                y = math.sin(dlng) * cos_tlat[i]
+                x = cos_lat1 * sin_tlat[i] - sin_lat1 * cos_tlat[i] * math.cos(dlng)
+                bearing = math.atan2(y, x)
+
+                new_lat_rad = math.asin(
+                    sin_lat1 * cos_ang + cos_lat1 * sin_ang * math.cos(bearing)
+                )
+                out_lat[i] = math.degrees(new_lat_rad)
+                out_lng[i] = math.degrees(lng1 + math.atan2(
+                    math.sin(bearing) * sin_ang * cos_lat1,
+                    cos_ang - sin_lat1 * math.sin(new_lat_rad)
+                ))
+
+            out_reached[i] = reached
+else:
+    _move_fleet_fused = None
@@ -0,0 +1,108 @@
+"""
+Notifications
+WebSocket fan-out helpers for the HTTP views
+"""
+
+import asyncio
+import logging
+import threading
+from collections import deque
+
+from channels.layers import get_channel_layer
+
+
+logger = logging.getLogger(__name__)
+
+
+# sends are scheduled onto the ASGI server's own event loop - the
+# in-memory channel layer binds its queues to the loop the consumers run
+# on, so group_send from any other loop races against them. The loop is
+# captured when the first consumer connects; until then there is nobody
+# in any group, so dropped sends lose nothing.
+_asgi_loop = None
+
+
+def capture_event_loop():
+    """Record the running ASGI loop (called from consumer connect)"""
+    global _asgi_loop
+    _asgi_loop = asyncio.get_running_loop()
+
+
+async def _send(group_name, message):
+    try:
+        await get_channel_layer().group_send(group_name, message)
+    except Exception as e:
+        logger.error(f"Error: WebSocket notification not sent to {group_name}: {e}")
+
+
+def notify_group(group_name, message):
+    """
+    Fire-and-forget group_send: schedule the send on the ASGI loop and
+    return immediately - delivery happens off the request thread
+    """
+    loop = _asgi_loop
+    if loop is None or loop.is_closed():
+        logger.debug(f"WebSocket notification dropped, no consumers yet: {group_name}")
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_send(group_name, message), loop)
+    except Exception as e:
+        logger.error(f"Error: WebSocket notification not queued for {group_name}: {e}")
+
+
+# coalesced command status updates: a burst of accepts/rejects within the
+# debounce window travels as one group message instead of one channel
+# layer round-trip per command
+COMMAND_STATUS_GROUP = "command_status_updates"
+_DEBOUNCE_SECONDS = 0.05
+
+_pending_updates = deque()
+_batch_lock = threading.Lock()
+_flush_scheduled = False
+
+
+async def _flush_command_updates():
+    global _flush_scheduled
+    await asyncio.sleep(_DEBOUNCE_SECONDS)
+
+    with _batch_lock:
+        _flush_scheduled = False
+        commands = list(_pending_updates)
+        _pending_updates.clear()
+
+    if not commands:
+        return
+
+    try:
+        await get_channel_layer().group_send(COMMAND_STATUS_GROUP, {
+            'type': 'command_update_batch',  # method in CommandStatusConsumer
+            'commands': commands
+        })
+    except Exception as e:
+        logger.error(f"Error: command update batch not sent: {e}")
+
+
+def notify_command_update(command_data):
+    """
+    Queue a command status update for the dashboard group
+    At most one flush per debounce window is scheduled; everything queued
+    in the meantime rides along in the same batch message
+    """
+    global _flush_scheduled
+    loop = _asgi_loop
+    if loop is None or loop.is_closed():
+        logger.debug("Command update dropped, no consumers yet")
+        return
+
+    with _batch_lock:
+        _pending_updates.append(command_data)
+        if _flush_scheduled:
+            return
+        _flush_scheduled = True
+
+    try:
+        asyncio.run_coroutine_threadsafe(_flush_command_updates(), loop)
+    except Exception as e:
+        with _batch_lock:
+            _flush_scheduled = False
+        logger.error(f"Error: command update batch not queued: {e}")
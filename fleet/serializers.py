@@ -23,16 +23,20 @@ class PlaneSerializer(GeoFeatureModelSerializer):
         ]
 
 
-class PlaneListSerializer(serializers.ModelSerializer):
-    """Lightweight serializer for listing planes"""
-    pilot_name = serializers.CharField(source='pilot.name', read_only=True)
-    
-    class Meta:
-        model = Plane
-        fields = [
-            'id', 'name', 'pilot_name', 
-            'current_position', 'updated_at'
-        ]
+class PlaneListSerializer(serializers.Serializer):
+    """
+    Lightweight serializer for listing planes
+    Reads the plain dicts produced by .values('id', 'name', 'updated_at',
+    'pilot__name') - no Plane/Pilot model instantiation and no deferred
+    field machinery per row.
+    Live coordinates are intentionally not included: they stream over the
+    positions websocket/endpoint, so the HTTP list skips the per-row
+    GEOS WKB -> JSON conversion entirely
+    """
+    id = serializers.IntegerField(read_only=True)
+    name = serializers.CharField(read_only=True)
+    pilot_name = serializers.CharField(source='pilot__name', read_only=True, allow_null=True)
+    updated_at = serializers.DateTimeField(read_only=True)
 
 
 class CommandSerializer(serializers.ModelSerializer):
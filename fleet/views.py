@@ -1,33 +1,139 @@
+import hashlib
+import math
+
+import numpy as np
+import orjson
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
 from django.shortcuts import render
+from django.utils import timezone
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
-from django.contrib.gis.geos import Point
-from django.contrib.gis.measure import Distance
+from django.contrib.gis.db.models import PointField
+from django.contrib.gis.geos import Point, Polygon
+from django.db.models.functions import Cast
+from django.contrib.gis.measure import D
 from django.db import connection
 from .models import Plane, Pilot, Command
 from .serializers import (
     PlaneSerializer, PlaneListSerializer, PilotSerializer,
     CommandSerializer, CommandCreateSerializer, CommandUpdateSerializer
 )
-from .movement_utils import calculate_distance
+from .movement_manager import movement_manager
+from .movement_utils import haversine_distances
+from .notifications import notify_group, notify_command_update
 
 
 class StandardResultsSetPagination(PageNumberPagination):
-    page_size = 10000  
+    page_size = 10000
     page_size_query_param = 'page_size'
     max_page_size = 10000
 
 
+class CachedCountPagination(StandardResultsSetPagination):
+    """
+    Pagination with the COUNT(*) cached per query string
+    PageNumberPagination re-counts the full result set on every page
+    request; here the count is cached for a short TTL and only page 1
+    recomputes it, so deep paging skips the repeated table scan
+    """
+    COUNT_TTL = 60  # seconds
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_number = request.query_params.get(self.page_query_param) or '1'
+
+        # canonical key: the page parameter is stripped and the remaining
+        # parameters sorted, so every page of one filtered result set
+        # shares the same cached count
+        params = request.query_params.copy()
+        params.pop(self.page_query_param, None)
+        canonical = request.path + '?' + '&'.join(sorted(params.urlencode().split('&')))
+        cache_key = 'drf_count:' + hashlib.md5(canonical.encode()).hexdigest()
+
+        # page 1 is the entry point - recompute there so the total stays
+        # fresh while deeper pages reuse the cached value
+        count = None if page_number == '1' else cache.get(cache_key)
+        if count is None:
+            count = queryset.count()
+            cache.set(cache_key, count, self.COUNT_TTL)
+
+        self._cached_count = int(count)
+        return super().paginate_queryset(queryset, request, view)
+
+    def django_paginator_class(self, queryset, page_size):
+        # called by DRF in place of the Paginator constructor - hand the
+        # paginator the precomputed count (assignment overrides the
+        # cached_property, so no COUNT(*) is issued)
+        paginator = Paginator(queryset, page_size)
+        paginator.count = self._cached_count
+        return paginator
+
+
+def _parse_filters(request):
+    """
+    Resolve the geographic filter parameters once per request
+    Returns ('radius', (lat, lng, radius_km), filter_info),
+    ('bbox', (min_lat, max_lat, min_lng, max_lng), filter_info), or
+    (None, None, None) when no valid filter is present
+    """
+    params = request.query_params
+
+    # Radius filtering (priority)
+    lat = params.get('lat')
+    lng = params.get('lng')
+    radius = params.get('radius')  # in km
+    if lat and lng and radius:
+        try:
+            lat_float = float(lat)
+            lng_float = float(lng)
+            radius_float = float(radius)
+        except (ValueError, TypeError):
+            return None, None, None  # invalid parameters, no filtering
+
+        return 'radius', (lat_float, lng_float, radius_float), {
+            'type': 'radius',
+            'lat': lat_float,
+            'lng': lng_float,
+            'radius_km': radius_float
+        }
+
+    # Bounding box filtering
+    min_lat = params.get('min_lat')
+    max_lat = params.get('max_lat')
+    min_lng = params.get('min_lng')
+    max_lng = params.get('max_lng')
+    if min_lat and max_lat and min_lng and max_lng:
+        try:
+            min_lat_float = float(min_lat)
+            max_lat_float = float(max_lat)
+            min_lng_float = float(min_lng)
+            max_lng_float = float(max_lng)
+        except (ValueError, TypeError):
+            return None, None, None  # invalid parameters, no filtering
+
+        return 'bbox', (min_lat_float, max_lat_float, min_lng_float, max_lng_float), {
+            'type': 'bounding_box',
+            'min_lat': min_lat_float,
+            'max_lat': max_lat_float,
+            'min_lng': min_lng_float,
+            'max_lng': max_lng_float
+        }
+
+    return None, None, None
+
+
 class PilotViewSet(viewsets.ReadOnlyModelViewSet):
     """
     Pilot list and details ,read-only
     """
     queryset = Pilot.objects.all().order_by('name')
     serializer_class = PilotSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CachedCountPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['name']
     search_fields = ['name']
@@ -52,9 +158,13 @@ class PlaneViewSet(viewsets.ReadOnlyModelViewSet):
         queryset = super().get_queryset()
         
         # Query optimization - only necessary fields
+        # (current_position is not listed: live coordinates stream over the
+        # positions websocket/endpoint instead)
+        # values() returns plain dicts, skipping Plane/Pilot model
+        # construction per row - PlaneListSerializer reads them directly
         if self.action == 'list':
-            queryset = queryset.only(
-                'id', 'name', 'current_position', 'updated_at', 'pilot__name'
+            queryset = queryset.values(
+                'id', 'name', 'updated_at', 'pilot__name'
             )
         elif self.action == 'positions':
             queryset = queryset.only(
@@ -69,13 +179,41 @@ class PlaneViewSet(viewsets.ReadOnlyModelViewSet):
         if lat and lng and radius:
             try:
                 center = Point(float(lng), float(lat), srid=4326)
-                distance = Distance(km=float(radius))
-                queryset = queryset.filter(
-                    current_position__distance_lte=(center, distance)
+                # cast to geography so dwithin takes a meter-based tolerance
+                # (geodetic geometry only accepts a degree value, which
+                # distorts with latitude) - ST_DWithin on geography
+                # prefilters with the bounding box before the exact
+                # distance check, unlike the per-row ST_Distance that
+                # distance_lte compiled to
+                queryset = queryset.annotate(
+                    position_geog=Cast(
+                        'current_position',
+                        PointField(geography=True, srid=4326)
+                    )
+                ).filter(
+                    position_geog__dwithin=(center, D(km=float(radius)))
                 )
             except (ValueError, TypeError):
                 pass
-        
+
+        # Bounding box filtering
+        min_lat = self.request.query_params.get('min_lat')
+        max_lat = self.request.query_params.get('max_lat')
+        min_lng = self.request.query_params.get('min_lng')
+        max_lng = self.request.query_params.get('max_lng')
+
+        if min_lat and max_lat and min_lng and max_lng:
+            try:
+                # bboverlaps compiles to the && bounding-box operator - the
+                # cheapest spatial predicate PostGIS has, answered directly
+                # by the GiST index PointField creates by default
+                bbox = Polygon.from_bbox((
+                    float(min_lng), float(min_lat), float(max_lng), float(max_lat)
+                ))
+                queryset = queryset.filter(current_position__bboverlaps=bbox)
+            except (ValueError, TypeError):
+                pass
+
         return queryset.order_by('name')
     
     @action(detail=False, methods=['get'])
@@ -83,105 +221,99 @@ class PlaneViewSet(viewsets.ReadOnlyModelViewSet):
         """
         Return only position information for all planes -read from memory
         """
-        from .movement_manager import movement_manager
-        
-        # Geographical filtering parameters
-        # Radius filtering
-        lat = request.query_params.get('lat')
-        lng = request.query_params.get('lng')
-        radius = request.query_params.get('radius')  # in km
-        
-        # Bounding box filtering
-        min_lat = request.query_params.get('min_lat')
-        max_lat = request.query_params.get('max_lat')
-        min_lng = request.query_params.get('min_lng')
-        max_lng = request.query_params.get('max_lng')
-        
-        # get positions from MovementManager
-        positions_with_heading = movement_manager.get_positions_with_heading()
-        
-        # get plane information from database
-        plane_info = {}
-        planes_in_db = Plane.objects.select_related('pilot').all()
-        for plane in planes_in_db:
-            plane_info[plane.id] = {
-                'name': plane.name,
-                'pilot_name': plane.pilot.name if plane.pilot else 'Pilot Yok'
-            }
-        
-        filter_info = None
-        features = []
-        
-        # process positions in memory
-        for plane_id, pos in positions_with_heading.items():
-            plane_lat = pos['current_lat']
-            plane_lng = pos['current_lng']
-            heading = pos['heading']
-            
-            # apply filtering
-            skip_plane = False
-            
+        # resolve the geographic filter once - no per-plane parsing or
+        # try/except in the loop below
+        mode, filter_params, filter_info = _parse_filters(request)
+
+        # columnar fleet snapshot straight from MovementManager - read-only
+        # arrays, headings computed at most once per movement tick, no
+        # per-request dict building
+        ids, lats, lngs, headings = movement_manager.snapshot()
+
+        # plane names/pilots come from the manager's signal-invalidated
+        # metadata cache - no ORM instantiation, no query per request
+        plane_info = movement_manager.get_plane_meta()
+
+        count = ids.size
+        if count > 0:
+            mask = None
+
             # Radius filtering (priority)
-            if lat and lng and radius:
-                try:
-                    lat_float = float(lat)
-                    lng_float = float(lng)
-                    radius_float = float(radius)
-                    
-                    distance = calculate_distance(plane_lat, plane_lng, lat_float, lng_float)
-                    if distance > radius_float * 1000:  # km -> metre
-                        skip_plane = True
-                    
-                    if not filter_info:
-                        filter_info = {
-                            'type': 'radius',
-                            'lat': lat_float,
-                            'lng': lng_float,
-                            'radius_km': radius_float
-                        }
-                except (ValueError, TypeError):
-                    pass  # invalid parameters, no filtering
-            
-            # Bounding box filtering
-            elif min_lat and max_lat and min_lng and max_lng:
-                try:
-                    min_lat_float = float(min_lat)
-                    max_lat_float = float(max_lat)
-                    min_lng_float = float(min_lng)
-                    max_lng_float = float(max_lng)
-                    
-                    if not (min_lat_float <= plane_lat <= max_lat_float and min_lng_float <= plane_lng <= max_lng_float):
-                        skip_plane = True
-                    
-                    if not filter_info:
-                        filter_info = {
-                            'type': 'bounding_box',
-                            'min_lat': min_lat_float,
-                            'max_lat': max_lat_float,
-                            'min_lng': min_lng_float,
-                            'max_lng': max_lng_float
-                        }
-                except (ValueError, TypeError):
-                    pass  # invalid parameters, no filtering
-            
-            # skip this plane
-            if skip_plane:
-                continue
-            
-            # get plane information
-            info = plane_info.get(plane_id, {'name': f'Plane {plane_id}', 'pilot_name': 'Pilot Yok'})
-            
-            # Format: [id, name, pilot, lng, lat, heading]
-            features.append([plane_id, info['name'], info['pilot_name'], plane_lng, plane_lat, heading])
-        
-        # sort by id
-        features.sort(key=lambda x: x[0])
-        
-        return Response({
-            'planes': features,  # [[id, plane_name, pilot_name, lng, lat, heading], ...]
-            'count': len(features),
-            'filters': filter_info
-        })
+            if mode == 'radius':
+                lat_float, lng_float, radius_float = filter_params
+
+                # cheap degree-box prune before any trig (filter-then-
+                # refine, same as a spatial index): 4 comparisons reject
+                # the far-away majority, the exact haversine below only
+                # touches the planes inside the box
+                lat_delta = radius_float / 110.574  # km -> degrees
+                lng_delta = radius_float / (111.320 * max(math.cos(math.radians(lat_float)), 1e-6))
+                # wrapped longitude delta - centers near +-180 keep planes
+                # just across the seam
+                dlng = np.remainder(lngs - lng_float + 180.0, 360.0) - 180.0
+                near = ((np.abs(lats - lat_float) <= lat_delta) &
+                        (np.abs(dlng) <= lng_delta))
+
+                mask = np.zeros(count, dtype=bool)
+                near_idx = np.flatnonzero(near)
+                if near_idx.size > 0:
+                    distances = haversine_distances(lats[near_idx], lngs[near_idx], lat_float, lng_float)
+                    mask[near_idx[distances <= radius_float * 1000]] = True  # km -> metre
+
+            # Bounding box filtering - no trig needed at all
+            elif mode == 'bbox':
+                min_lat_float, max_lat_float, min_lng_float, max_lng_float = filter_params
+
+                # test the tighter box dimension first and only compare the
+                # other one for its survivors - the rejected majority is out
+                # after two comparisons instead of four
+                if (max_lat_float - min_lat_float) <= (max_lng_float - min_lng_float):
+                    first, lo1, hi1 = lats, min_lat_float, max_lat_float
+                    second, lo2, hi2 = lngs, min_lng_float, max_lng_float
+                else:
+                    first, lo1, hi1 = lngs, min_lng_float, max_lng_float
+                    second, lo2, hi2 = lats, min_lat_float, max_lat_float
+
+                mask = (first >= lo1) & (first <= hi1)
+                inside = np.flatnonzero(mask)
+                if inside.size > 0:
+                    sub = second[inside]
+                    mask[inside[(sub < lo2) | (sub > hi2)]] = False
+
+            # keep only the survivors
+            if mask is not None:
+                ids = ids[mask]
+                lats = lats[mask]
+                lngs = lngs[mask]
+                headings = headings[mask]
+
+        # name/pilot columns looked up once per surviving plane - meta
+        # entries are (name, pilot_name) tuples
+        id_list = ids.tolist()
+        names = []
+        pilots = []
+        for plane_id in id_list:
+            name, pilot_name = plane_info.get(plane_id, (f'Plane {plane_id}', 'Pilot Yok'))
+            names.append(name)
+            pilots.append(pilot_name)
+
+        # columnar payload, already in id order (the snapshot keeps ids
+        # ascending): homogeneous columns take orjson's typed fast paths,
+        # compress better than row tuples, and stream one column per chunk
+        # instead of materializing one giant JSON string
+        numpy_opt = orjson.OPT_SERIALIZE_NUMPY
+
+        def stream():
+            yield b'{"ids":' + orjson.dumps(id_list)
+            yield b',"names":' + orjson.dumps(names)
+            yield b',"pilots":' + orjson.dumps(pilots)
+            yield b',"lng":' + orjson.dumps(lngs, option=numpy_opt)
+            yield b',"lat":' + orjson.dumps(lats, option=numpy_opt)
+            yield b',"heading":' + orjson.dumps(headings, option=numpy_opt)
+            yield (b',"count":' + orjson.dumps(len(id_list)) +
+                   b',"filters":' + orjson.dumps(filter_info) + b'}')
+
+        return StreamingHttpResponse(stream(), content_type='application/json')
     
     @action(detail=True, methods=['get'])
     def commands(self, request, pk=None):
@@ -189,7 +321,11 @@ class PlaneViewSet(viewsets.ReadOnlyModelViewSet):
         List commands for a specific plane
         """
         plane = self.get_object()
-        commands = Command.objects.filter(plane=plane).order_by('-created_at')
+        # select_related: CommandSerializer renders plane_name per row and
+        # would otherwise issue a query per command
+        commands = Command.objects.select_related('plane', 'plane__pilot').filter(
+            plane=plane
+        ).order_by('-created_at')
         
         page = self.paginate_queryset(commands)
         if page is not None:
@@ -205,7 +341,7 @@ class CommandViewSet(viewsets.ModelViewSet):
     Command management (CRUD)
     """
     queryset = Command.objects.select_related('plane', 'plane__pilot').all()
-    pagination_class = StandardResultsSetPagination
+    pagination_class = CachedCountPagination
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['status', 'plane__name']
     search_fields = ['message', 'plane__name']
@@ -232,13 +368,25 @@ class CommandViewSet(viewsets.ModelViewSet):
         Special actions when command status is updated
         """
         command = serializer.save()
-        
+
         # if command is accepted, update the plane's route
         if command.status == 'accepted':
             plane = command.plane
-            plane.start_point = plane.current_position
+            new_start = plane.current_position
+
+            # targeted UPDATE: one statement, no model save machinery and
+            # no signal handlers on the hot path
+            Plane.objects.filter(pk=command.plane_id).update(
+                start_point=new_start,
+                end_point=command.target_location,
+                updated_at=timezone.now()
+            )
+
+            # .update() bypasses post_save, so push the new route into the
+            # in-memory fleet explicitly (the signal normally does this)
+            plane.start_point = new_start
             plane.end_point = command.target_location
-            plane.save(update_fields=['start_point', 'end_point', 'updated_at'])
+            movement_manager.upsert_plane(plane)
     
     @action(detail=False, methods=['get'])
     def pending(self, request):
@@ -268,7 +416,6 @@ class CommandViewSet(viewsets.ModelViewSet):
         
         # 1. update MovementManager
         try:
-            from .movement_manager import movement_manager
             movement_manager.update_plane_target(
                 plane_id=command.plane.id,
                 new_target_lat=command.target_location.y,
@@ -277,26 +424,14 @@ class CommandViewSet(viewsets.ModelViewSet):
         except Exception as e:
             print(f"HATA: MovementManager güncellenemedi: {e}")
 
-        # 2. send notification to the general dashboard channel
-        try:
-            from channels.layers import get_channel_layer
-            from asgiref.sync import async_to_sync
-            
-            channel_layer = get_channel_layer()
-            group_name = "command_status_updates" # general group name
-            
-            message = {
-                'type': 'command_update', # method in CommandStatusConsumer
-                'command': self.get_serializer(command).data
-            }
-            
-            async_to_sync(channel_layer.group_send)(group_name, message)
-        except Exception as e:
-            print(f"Error: WebSocket 'accept' notification not sent: {e}")
+        # 2. send notification to the general dashboard channel - fire and
+        # forget, bursts are coalesced into one batch message
+        # (serialized once, the same payload serves the HTTP response)
+        data = self.get_serializer(command).data
+        notify_command_update(data)
+
+        return Response(data)
 
-        serializer = self.get_serializer(command)
-        return Response(serializer.data)
-    
     @action(detail=True, methods=['post'])
     def reject(self, request, pk=None):
        
@@ -310,51 +445,35 @@ class CommandViewSet(viewsets.ModelViewSet):
         command.status = 'rejected'
         command.save()
         
-        # send notification to the general dashboard channel
-        try:
-            from channels.layers import get_channel_layer
-            from asgiref.sync import async_to_sync
-            
-            channel_layer = get_channel_layer()
-            group_name = "command_status_updates" # general group name
-            
-            message = {
-                'type': 'command_update', # method in CommandStatusConsumer
-                'command': self.get_serializer(command).data
-            }
-            
-            async_to_sync(channel_layer.group_send)(group_name, message)
-        except Exception as e:
-            print(f"Error: WebSocket 'reject' notification not sent: {e}")
-        
-        serializer = self.get_serializer(command)
-        return Response(serializer.data)
+        # send notification to the general dashboard channel - fire and
+        # forget, bursts are coalesced into one batch message
+        # (serialized once, the same payload serves the HTTP response)
+        data = self.get_serializer(command).data
+        notify_command_update(data)
+
+        return Response(data)
 
     def perform_create(self, serializer):
         """Send WebSocket notification to the pilot when a new command is created"""
         command = serializer.save() # status='pending' is already set in serializer
         
-        # send notification to the pilot
+        # send notification to the pilot - fire and forget, delivery runs
+        # off the request thread
         try:
-            from channels.layers import get_channel_layer
-            from asgiref.sync import async_to_sync
-            
+            # the freshly saved instance has no relations loaded, so the
+            # pilot name and the serializer's plane_name would each lazy-load
+            # a row - one JOINed re-fetch covers both
+            command = Command.objects.select_related('plane__pilot').get(pk=command.pk)
+
             #we need to re-serialize to get plane_name or etc.
-            from .serializers import CommandSerializer 
             command_data = CommandSerializer(command).data
 
-            channel_layer = get_channel_layer()
             pilot_name = command.plane.pilot.name
-            group_name = f'pilot_{pilot_name}'
-            
-            #prepare message
-            message = {
+
+            notify_group(f'pilot_{pilot_name}', {
                 'type': 'command_new',  # method in PilotCommandConsumer
                 'command': command_data
-            }
-            
-            # send to the group
-            async_to_sync(channel_layer.group_send)(group_name, message)
-            
+            })
+
         except Exception as e:
             print(f"Error: WebSocket notification not sent: {e}")